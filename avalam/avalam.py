@@ -71,6 +71,7 @@ class Board:
         self.columns = len(self.m[0])
         self.max_height = max_height
         self.m = self.get_percepts(invert)  # make a copy of the percepts
+        self.undo_stack = []
 
     def __str__(self):
         def str_cell(i, j):
@@ -147,6 +148,32 @@ class Board:
             return True
         return False
 
+    def get_regions(self):
+        """Return the independent regions of the board.
+
+        A region is a list of the (i, j) coordinates of movable towers,
+        connected by valid actions. Towers only grow, so towers of different
+        regions will never be merged: the regions can be played separately.
+
+        """
+        regions = []
+        seen = set()
+        for i, j, h in self.get_towers():
+            if (i, j) in seen or not self.is_tower_movable(i, j):
+                continue
+            seen.add((i, j))
+            region = []
+            stack = [(i, j)]
+            while stack:
+                cell = stack.pop()
+                region.append(cell)
+                for _, _, ni, nj in self.get_tower_actions(*cell):
+                    if (ni, nj) not in seen:
+                        seen.add((ni, nj))
+                        stack.append((ni, nj))
+            regions.append(region)
+        return regions
+
     def get_actions(self):
         """Yield all valid actions on this board."""
         for i, j, h in self.get_towers():
@@ -173,6 +200,28 @@ class Board:
         self.m[i1][j1] = 0
         return self
 
+    def push(self, action):
+        """Play an action in place, remembering how to undo it with pop().
+
+        Only the two touched cells are recorded, which makes push()/pop()
+        much cheaper than clone().play_action(action) in a search. If the
+        action is invalid, raise an InvalidAction exception. Return self.
+
+        """
+        if not self.is_action_valid(action):
+            raise InvalidAction(action)
+        i1, j1, i2, j2 = action
+        self.undo_stack.append((i1, j1, self.m[i1][j1],
+                                i2, j2, self.m[i2][j2]))
+        return self.play_action(action)
+
+    def pop(self):
+        """Undo the last action played with push(). Return self."""
+        i1, j1, x1, i2, j2, x2 = self.undo_stack.pop()
+        self.m[i1][j1] = x1
+        self.m[i2][j2] = x2
+        return self
+
     def is_finished(self):
         """Return whether no more moves can be made (i.e., game finished)."""
         for action in self.get_actions():
@@ -281,10 +330,15 @@ from xmlrpc.server import SimpleXMLRPCServer
 class SimpleThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
     pass
 
-def serve_agent(agent, address, port):
-    """Serve agent on specified bind address and port number."""
-    server = SimpleThreadedXMLRPCServer((address, port), allow_none=True)
-    server.register_instance(agent)
+def serve_agent(agent, address, port, rpc="xmlrpc"):
+    """Serve agent on specified bind address and port number, over XML-RPC
+    or over the binary transport of binary_rpc.py (rpc="binary")."""
+    if rpc == "binary":
+        from binary_rpc import BinaryAgentServer
+        server = BinaryAgentServer((address, port), agent)
+    else:
+        server = SimpleThreadedXMLRPCServer((address, port), allow_none=True)
+        server.register_instance(agent)
     print("Listening on ", address, ":", port, sep="")
     try:
         server.serve_forever()
@@ -318,10 +372,65 @@ def agent_main(agent, args_cb=None, setup_cb=None):
                         help="bind to address ADDRESS (default: *)")
     parser.add_argument("-p", "--port", type=portarg, default=8000,
                         help="set port number (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of processes used by the search of" +
+                             " agents supporting it (default: %(default)s)")
+    parser.add_argument("--rpc", choices=("xmlrpc", "binary"),
+                        default="xmlrpc",
+                        help="transport: XML-RPC over HTTP, or persistent" +
+                             " connections with binary frames, for" +
+                             " avalam://host:port URIs (default:" +
+                             " %(default)s)")
     if args_cb is not None:
         args_cb(agent, parser)
+    parser.add_argument("--parallel", choices=("split", "lazy"),
+                        default="split",
+                        help="parallel search: split the root moves among" +
+                             " the processes or let them share a" +
+                             " transposition table (lazy SMP, agents with" +
+                             " a table only) (default: %(default)s)")
+    parser.add_argument("--tablebase", metavar="FILE",
+                        help="endgame tablebase probed by the search of" +
+                             " agents supporting it (see" +
+                             " scripts/generate_tablebase.py)")
+    parser.add_argument("--book", metavar="FILE",
+                        help="opening book played by agents supporting it" +
+                             " (see scripts/build_book.py)")
+    parser.add_argument("--tt-file", metavar="FILE",
+                        help="transposition table file warm-starting the" +
+                             " search of agents supporting it, and into" +
+                             " which their deep results are merged after" +
+                             " each game (shared by the processes using it)")
+    parser.add_argument("--ponder", type=float, metavar="SECONDS",
+                        help="keep searching for at most SECONDS during the" +
+                             " opponent's turn, in the helper processes, for" +
+                             " agents supporting it (statistics printed" +
+                             " at the start of each game)")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="append the statistics of each search of" +
+                             " agents supporting it to FILE as JSON lines" +
+                             " (- for stderr, see search_stats.py)")
     args = parser.parse_args()
+    agent.workers = args.workers
+    agent.parallel = args.parallel
+    if args.tablebase:
+        from tablebase import Tablebase
+        agent.tablebase = Tablebase(args.tablebase)
+    if args.tt_file:
+        agent.tt_file = args.tt_file
+    if args.book:
+        from book import OpeningBook
+        agent.book = OpeningBook(args.book)
+    if args.ponder:
+        agent.ponder = True
+        agent.ponder_time = args.ponder
+    if args.stats:
+        import os
+        import sys
+        from search_stats import SearchStats
+        name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        agent.stats = SearchStats(args.stats, name)
     if setup_cb is not None:
         setup_cb(agent, parser, args)
 
-    serve_agent(agent, args.address, args.port)
\ No newline at end of file
+    serve_agent(agent, args.address, args.port, args.rpc)
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Vectorized evaluation of many Avalam positions at once.
+
+Positions are stacked in an (N, rows, columns) int8 array of signed tower
+heights, as in Board.m (0 for empty and invalid cells, which Avalam treats
+the same way). Every feature is computed with whole-array operations, so
+scoring the children of a node, or all the positions of a set of game
+traces, costs a handful of numpy calls instead of a Python loop per cell.
+
+"""
+import numpy as np
+
+from fast_board import DIRECTIONS
+
+# Fields of the dictionary returned by evaluate_batch
+FEATURES = ("score", "towers", "full", "isolated", "moves")
+
+
+def positions_array(boards):
+    """Stack boards (Board instances or percepts) in an int8 array."""
+    return np.array([getattr(board, "m", board) for board in boards],
+                    dtype=np.int8)
+
+
+def trace_positions(trace):
+    """Return the positions of a game.Trace, initial board included.
+
+    Return a pair (positions, players) where players[k] is the player to
+    move in positions[k] (0 for the final position).
+
+    """
+    board = trace.initial_board.clone()
+    boards = [board.get_percepts()]
+    players = []
+    for player, action, _ in trace.actions:
+        players.append(player)
+        board.play_action(action)
+        boards.append(board.get_percepts())
+    players.append(0)
+    return positions_array(boards), np.array(players, dtype=np.int8)
+
+
+def _neighbours(positions):
+    """Yield the heights of the neighbour of every cell in each direction
+    (0 off the board)."""
+    n, rows, columns = positions.shape
+    padded = np.zeros((n, rows + 2, columns + 2), dtype=positions.dtype)
+    padded[:, 1:-1, 1:-1] = positions
+    for di, dj in DIRECTIONS:
+        yield padded[:, 1 + di:1 + di + rows, 1 + dj:1 + dj + columns]
+
+
+def evaluate_batch(positions, max_height=5):
+    """Evaluate a batch of positions.
+
+    Return a dictionary of arrays indexed by position:
+    score -- Board.get_score() of each position, shape (N,)
+    towers -- number of towers of PLAYER1 and PLAYER2, shape (N, 2)
+    full -- number of towers of max_height of each player, shape (N, 2)
+    isolated -- number of towers of each player that cannot be moved nor
+        receive a tower anymore (they are secured), shape (N, 2)
+    moves -- number of legal actions, shape (N,)
+
+    Arguments:
+    positions -- int8 array of shape (N, rows, columns), or (rows, columns)
+        for a single position
+    max_height -- maximal height of a tower
+
+    """
+    positions = np.asarray(positions, dtype=np.int8)
+    if positions.ndim == 2:
+        positions = positions[np.newaxis]
+    heights = np.abs(positions)
+    mine = positions > 0
+    theirs = positions < 0
+    occupied = heights > 0
+
+    movable = np.zeros(positions.shape, dtype=bool)
+    moves = np.zeros(len(positions), dtype=np.int32)
+    for neighbour in _neighbours(heights):
+        valid = occupied & (neighbour > 0) & \
+            (heights + neighbour <= max_height)
+        movable |= valid
+        moves += valid.sum(axis=(1, 2), dtype=np.int32)
+    isolated = occupied & ~movable
+    full = heights == max_height
+
+    def per_player(mask):
+        return np.stack((
+            (mask & mine).sum(axis=(1, 2), dtype=np.int32),
+            (mask & theirs).sum(axis=(1, 2), dtype=np.int32)), axis=1)
+
+    towers = per_player(occupied)
+    full = per_player(full)
+    tower_diff = towers[:, 0] - towers[:, 1]
+    score = np.where(tower_diff != 0, tower_diff, full[:, 0] - full[:, 1])
+    return {
+        "score": score,
+        "towers": towers,
+        "full": full,
+        "isolated": per_player(isolated),
+        "moves": moves,
+    }
+
+
+def expand_children(position, actions):
+    """Return the positions reached by playing each action from position.
+
+    Arguments:
+    position -- int8 array of shape (rows, columns)
+    actions -- sequence of K actions (i1, j1, i2, j2)
+
+    Return an int8 array of shape (K, rows, columns).
+
+    """
+    position = np.asarray(position, dtype=np.int8)
+    actions = np.asarray(actions, dtype=np.intp).reshape(-1, 4)
+    k = np.arange(len(actions))
+    i1, j1, i2, j2 = actions.T
+    src = position[i1, j1]
+    dst = position[i2, j2]
+    children = np.repeat(position[np.newaxis], len(actions), axis=0)
+    children[k, i1, j1] = 0
+    children[k, i2, j2] = np.sign(src) * (np.abs(src) + np.abs(dst))
+    return children
+
+
+def random_playouts(position, count, rng, max_height=5):
+    """Play count random games at once from position to their end.
+
+    The games are stacked in an (count, rows, columns) array and advanced
+    together, one uniformly drawn legal action per game and per step (as
+    FastBoard.random_action), with whole-array operations only. Return the
+    winners, an int8 array of shape (count, ) holding 1 for PLAYER1, -1 for
+    PLAYER2 and 0 for a draw.
+
+    Arguments:
+    position -- int8 array of shape (rows, columns) (or a Board or percepts)
+    count -- number of games
+    rng -- the numpy.random.Generator drawing the actions
+    max_height -- maximal height of a tower
+
+    """
+    games = np.repeat(positions_array([position]), count, axis=0)
+    n, rows, columns = games.shape
+    offsets = np.array(DIRECTIONS, dtype=np.intp)
+    index = np.arange(n)
+    active = index
+    while len(active):
+        boards = games[active]
+        heights = np.abs(boards)
+        # valid[k, d, i, j]: the tower on (i, j) can be moved in direction d
+        valid = np.stack([(heights > 0) & (neighbour > 0)
+                          & (heights + neighbour <= max_height)
+                          for neighbour in _neighbours(heights)], axis=1)
+        flat = valid.reshape(len(active), -1)
+        counts = flat.sum(axis=1)
+        playing = counts > 0
+        if not playing.all():
+            active, flat, counts, boards = active[playing], flat[playing], \
+                counts[playing], boards[playing]
+            if not len(active):
+                break
+        # The (r + 1)-th legal action of each game
+        r = (rng.random(len(active)) * counts).astype(np.intp)
+        chosen = np.argmax(np.cumsum(flat, axis=1, dtype=np.int16)
+                           > r[:, np.newaxis], axis=1)
+        d, cell = np.divmod(chosen, rows * columns)
+        i, j = np.divmod(cell, columns)
+        ni, nj = i + offsets[d, 0], j + offsets[d, 1]
+        src = games[active, i, j]
+        dst = games[active, ni, nj]
+        games[active, ni, nj] = np.sign(src) * (np.abs(src) + np.abs(dst))
+        games[active, i, j] = 0
+    return np.sign(evaluate_batch(games, max_height)["score"]).astype(np.int8)
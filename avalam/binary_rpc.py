@@ -0,0 +1,195 @@
+"""
+Binary RPC transport between the game and the agents.
+
+An alternative to XML-RPC over HTTP: the game keeps one TCP connection open
+to each agent and exchanges length-prefixed frames ("<I" payload size, then
+the payload) holding struct-packed requests and replies. Boards are sent as
+their dimensions followed by one signed byte per cell. The agents receive
+the same arguments as over XML-RPC (the percepts of a board being the
+dictionary of its attributes) and the server runs one thread per
+connection instead of one per call.
+
+Requests: an operation code, then
+- OP_PLAY: board, player ("b"), step ("H"), time_left ("d", NaN for None);
+- OP_INITIALIZE: board, the players ("B" count then "b" each), time_left.
+Replies: a status; STATUS_OK followed by an action ("4B", all 255 for
+None), or STATUS_ERROR followed by the UTF-8 message of the exception
+raised by the agent.
+
+Use the scheme "avalam://host:port" with game.connect_agent and the option
+--rpc binary of agent_main.
+
+"""
+import math
+import socket
+import socketserver
+import struct
+
+SCHEME = "avalam://"
+FRAME = struct.Struct("<I")
+OP_PLAY, OP_INITIALIZE = 1, 2
+STATUS_OK, STATUS_ERROR = 0, 1
+BOARD = struct.Struct("<3B")
+PLAY = struct.Struct("<bHd")
+ACTION = struct.Struct("<4B")
+NO_ACTION = (255, 255, 255, 255)
+
+
+class RemoteError(Exception):
+    """The agent has raised an exception."""
+
+
+def encode_board(board):
+    """Return the encoding of a board (an avalam.Board or its percepts
+    dictionary)."""
+    if isinstance(board, dict):
+        m, max_height = board["m"], board["max_height"]
+    else:
+        m, max_height = board.m, board.max_height
+    rows, columns = len(m), len(m[0])
+    return BOARD.pack(rows, columns, max_height) + struct.pack(
+        "<%db" % (rows * columns), *(x for row in m for x in row))
+
+
+def decode_board(data, offset):
+    """Return (percepts, end) for the board encoded at offset in data."""
+    rows, columns, max_height = BOARD.unpack_from(data, offset)
+    offset += BOARD.size
+    cells = struct.unpack_from("<%db" % (rows * columns), data, offset)
+    m = [list(cells[i * columns:(i + 1) * columns]) for i in range(rows)]
+    percepts = {"m": m, "rows": rows, "columns": columns,
+                "max_height": max_height}
+    return percepts, offset + rows * columns
+
+
+def _time(time_left):
+    return math.nan if time_left is None else time_left
+
+
+def _untime(value):
+    return None if math.isnan(value) else value
+
+
+def recv_exactly(sock, size):
+    """Return size bytes read from sock."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Return the payload of the next frame read from sock."""
+    size, = FRAME.unpack(recv_exactly(sock, FRAME.size))
+    return recv_exactly(sock, size)
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME.pack(len(payload)) + payload)
+
+
+class BinaryAgentProxy:
+
+    """Remote agent reached over a persistent binary RPC connection.
+
+    Calls block for at most the default socket timeout when they are made
+    (set by Game.timed_exec from the time credit), and raise socket.timeout
+    once it expires. The connection is then dropped (a late reply would
+    otherwise answer the next call) and opened again by the next call.
+
+    """
+
+    def __init__(self, uri):
+        address = uri[len(SCHEME):] if uri.startswith(SCHEME) else uri
+        host, _, port = address.rstrip("/").rpartition(":")
+        self.address = (host or "localhost", int(port))
+        self.sock = None
+
+    def _call(self, payload):
+        try:
+            if self.sock is None:
+                self.sock = socket.create_connection(self.address)
+                self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                     1)
+            self.sock.settimeout(socket.getdefaulttimeout())
+            send_frame(self.sock, payload)
+            reply = recv_frame(self.sock)
+        except OSError:
+            self.close()
+            raise
+        if reply[0] == STATUS_ERROR:
+            raise RemoteError(reply[1:].decode())
+        return reply[1:]
+
+    def play(self, board, player, step, time_left=None):
+        reply = self._call(bytes((OP_PLAY, )) + encode_board(board)
+                           + PLAY.pack(player, step, _time(time_left)))
+        action = ACTION.unpack(reply)
+        return None if action == NO_ACTION else action
+
+    def initialize(self, board, players, time_left=None):
+        self._call(bytes((OP_INITIALIZE, )) + encode_board(board)
+                   + struct.pack("<B%db" % len(players), len(players),
+                                 *players)
+                   + struct.pack("<d", _time(time_left)))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class _AgentHandler(socketserver.BaseRequestHandler):
+
+    """Answer the calls of one connection until it is closed."""
+
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        agent = self.server.agent
+        while True:
+            try:
+                request = recv_frame(sock)
+            except OSError:
+                return
+            try:
+                percepts, offset = decode_board(request, 1)
+                if request[0] == OP_PLAY:
+                    player, step, time_left = PLAY.unpack_from(request,
+                                                               offset)
+                    action = agent.play(percepts, player, step,
+                                        _untime(time_left))
+                    reply = bytes((STATUS_OK, )) + ACTION.pack(
+                        *(NO_ACTION if action is None else action))
+                elif request[0] == OP_INITIALIZE:
+                    count = request[offset]
+                    players = list(struct.unpack_from(
+                        "<%db" % count, request, offset + 1))
+                    time_left, = struct.unpack_from(
+                        "<d", request, offset + 1 + count)
+                    agent.initialize(percepts, players, _untime(time_left))
+                    reply = bytes((STATUS_OK, ))
+                else:
+                    raise ValueError("unknown operation %d" % request[0])
+            except Exception as e:
+                reply = bytes((STATUS_ERROR, )) + repr(e).encode()
+            try:
+                send_frame(sock, reply)
+            except OSError:
+                return
+
+
+class BinaryAgentServer(socketserver.ThreadingTCPServer):
+
+    """Server of an agent over binary RPC, a thread per connection."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, agent):
+        socketserver.ThreadingTCPServer.__init__(self, address,
+                                                 _AgentHandler)
+        self.agent = agent
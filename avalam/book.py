@@ -0,0 +1,161 @@
+"""
+Opening book built from game traces.
+
+BookBuilder replays traces (game.Trace, as written by scripts/generate_games.py)
+and counts, for each position of their first plies and each move played
+from it, the number of games and their total result for the side to move
+(+1 per win, -1 per loss). Positions are keyed by FastBoard.canonical_key(),
+so that the moves of symmetric positions are counted together, and moves are
+stored for the canonical position (see symmetry.py).
+
+write_book() saves the statistics in a file of records sorted by key, and
+OpeningBook memory-maps such a file and finds the moves of a position by
+binary search.
+
+File layout: header (magic, version, max_ply, count), count keys ("Q",
+sorted), count moves ("H", packed as in transposition_table.pack_action),
+count game counts ("I"), count results ("i").
+
+"""
+import bisect
+import mmap
+import struct
+
+from fast_board import FastBoard
+from transposition_table import pack_action, unpack_action
+
+MAGIC = b"AVBK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+
+
+class BookBuilder:
+
+    """Move statistics of the first plies of a set of games."""
+
+    def __init__(self, max_ply=12):
+        self.max_ply = max_ply
+        # {(key, packed move): [games, result]}
+        self.stats = {}
+        self.games = 0
+
+    def add_game(self, initial_board, actions, winner):
+        """Count the moves of a game.
+
+        Arguments:
+        initial_board -- the initial board as a matrix of percepts
+        actions -- sequence of (player, action) pairs
+        winner -- the result of the game (>0: PLAYER1 won, <0: PLAYER2 won,
+            0: draw)
+
+        """
+        winner = (winner > 0) - (winner < 0)
+        board = FastBoard(initial_board)
+        stats = self.stats
+        for ply, (player, action) in enumerate(actions):
+            if ply >= self.max_ply:
+                break
+            board.set_player(player)
+            key, rotated = board.canonical_key()
+            move = board.rotate_action(action) if rotated else action
+            entry = stats.get((key, pack_action(move)))
+            if entry is None:
+                stats[key, pack_action(move)] = [1, winner * player]
+            else:
+                entry[0] += 1
+                entry[1] += winner * player
+            board.push(action)
+        self.games += 1
+
+    def add_trace(self, trace):
+        """Count the moves of a game.Trace."""
+        self.add_game(trace.initial_board.m,
+                      [(player, action) for player, action, _ in trace.actions],
+                      trace.winner)
+
+
+def write_book(path, builder, min_games=1):
+    """Write the moves of builder played in at least min_games games to the
+    file path and return the number of records written."""
+    records = sorted((key, move, games, result)
+                     for (key, move), (games, result) in builder.stats.items()
+                     if games >= min_games)
+    count = len(records)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, builder.max_ply, count))
+        for k, fmt in enumerate("QHIi"):
+            f.write(struct.pack("<%d%s" % (count, fmt),
+                                *(r[k] for r in records)))
+    return count
+
+
+class OpeningBook:
+
+    """Read-only, memory-mapped opening book file."""
+
+    # Moves played in fewer games are not chosen by probe
+    min_games = 3
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_ply, self.count = \
+            HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not an opening book file" % path)
+        self.arrays = []
+        start = HEADER.size
+        view = memoryview(self.mmap)
+        for fmt, size in (("Q", 8), ("H", 2), ("I", 4), ("i", 4)):
+            self.arrays.append(view[start:start + size * self.count].cast(fmt))
+            start += size * self.count
+        self.keys, self.moves, self.games, self.results = self.arrays
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, board, player):
+        """Return the list of the (action, games, result) triplets of the
+        moves of board with player to move, result being the total result
+        of the games for player.
+
+        Arguments:
+        board -- a FastBoard
+        player -- the side to move
+
+        """
+        board.set_player(player)
+        key, rotated = board.canonical_key()
+        k = bisect.bisect_left(self.keys, key)
+        moves = []
+        while k < self.count and self.keys[k] == key:
+            action = unpack_action(self.moves[k])
+            if rotated:
+                action = board.rotate_action(action)
+            moves.append((action, self.games[k], self.results[k]))
+            k += 1
+        return moves
+
+    def probe(self, board, player):
+        """Return the move of the book with the best average result for
+        player among those played in at least min_games games, or None."""
+        best = None
+        for action, games, result in self.lookup(board, player):
+            # A key collision could give an invalid move
+            if games < self.min_games or not board.is_action_valid(action):
+                continue
+            if best is None or result * best[1] > best[2] * games or \
+                    (result * best[1] == best[2] * games and games > best[1]):
+                best = (action, games, result)
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best[0]
+
+    def close(self):
+        for array in self.arrays:
+            array.release()
+        self.mmap.close()
@@ -0,0 +1,602 @@
+"""
+Fast Avalam board engine.
+
+FastBoard is a drop-in replacement for avalam.Board meant to be used by the
+search agents.  The board is stored as a flat list of signed heights (one
+entry per cell, row-major) and every playable cell keeps an 8-bit mask of the
+neighbours it can currently be merged with.  Since a move only changes the
+two cells it touches, the masks, the number of legal moves and the score are
+all kept up to date incrementally in play_action.
+
+The bidimensional self.m array of Board is kept in sync so that code reading
+the board directly (viewers, heuristics) keeps working.
+
+"""
+import random
+
+from avalam import Board, InvalidAction
+
+# Neighbour offsets, in the same order as Board.get_tower_actions.  The
+# opposite of direction d is always direction 7 - d.
+DIRECTIONS = ((-1, -1), (-1, 0), (-1, 1),
+              ( 0, -1),          ( 0, 1),
+              ( 1, -1), ( 1, 0), ( 1, 1))
+DIRECTION_INDEX = {delta: d for d, delta in enumerate(DIRECTIONS)}
+
+POPCOUNT = tuple(bin(x).count("1") for x in range(256))
+
+# The Zobrist tables are drawn from a fixed seed so that keys are the same in
+# every process (shared or saved transposition tables rely on it).
+ZOBRIST_SEED = 8215
+ZOBRIST_SIDE = random.Random(ZOBRIST_SEED).getrandbits(64)
+
+_zobrist_tables = {}
+
+
+def get_zobrist_table(size, max_height):
+    """Return the Zobrist table for size cells and towers up to max_height.
+
+    table[c][x] is the 64-bit random number of tower x (signed height) on
+    cell c, indexed directly with x thanks to negative indices. Empty cells
+    have a 0 entry so that they do not contribute to the key.
+
+    """
+    key = (size, max_height)
+    table = _zobrist_tables.get(key)
+    if table is None:
+        rng = random.Random(ZOBRIST_SEED + size * 31 + max_height)
+        table = [[0] + [rng.getrandbits(64) for _ in range(2 * max_height)]
+                 for _ in range(size)]
+        _zobrist_tables[key] = table
+    return table
+
+
+class Geometry:
+
+    """Precomputed tables for a given set of playable cells.
+
+    Empty cells can never be filled again, so the cells that are not empty
+    when a board is created are the only ones that matter for the rest of the
+    game.  The tables are shared by all the boards (and clones) built on the
+    same cells.
+
+    Attributes:
+    rows, columns -- dimensions of the board
+    cells -- indices of the playable cells, in raster order
+    coords -- coords[c] is the (i, j) pair of cell c
+    offsets -- offsets[d] is the index offset of direction d
+    neighbours -- neighbours[c] is a tuple of (bit, n, back_bit) triplets
+        where n is the playable neighbour of c in the direction of bit and
+        back_bit is the bit of c in the mask of n
+    actions -- actions[c][mask] is the tuple of actions moving the tower on
+        c toward the neighbours selected by mask
+    symmetric -- whether the cells are invariant under the rotation of 180
+        degrees (cell c going to cell rows * columns - 1 - c), as those of
+        the standard board
+
+    """
+
+    def __init__(self, rows, columns, cells):
+        self.rows = rows
+        self.columns = columns
+        self.cells = tuple(cells)
+        self.coords = [divmod(c, columns) for c in range(rows * columns)]
+        self.offsets = tuple(di * columns + dj for di, dj in DIRECTIONS)
+        playable = set(self.cells)
+        self.symmetric = all(rows * columns - 1 - c in playable
+                             for c in self.cells)
+        self.neighbours = [() for _ in range(rows * columns)]
+        self.actions = [None] * (rows * columns)
+        for c in self.cells:
+            i, j = self.coords[c]
+            neighbours = []
+            for d, (di, dj) in enumerate(DIRECTIONS):
+                ni, nj = i + di, j + dj
+                n = ni * columns + nj
+                if 0 <= ni < rows and 0 <= nj < columns and n in playable:
+                    neighbours.append((1 << d, n, 1 << (7 - d)))
+            self.neighbours[c] = tuple(neighbours)
+            full = sum(bit for bit, _, _ in neighbours)
+            table = [None] * 256
+            for mask in range(256):
+                if mask & ~full:
+                    continue
+                table[mask] = tuple((i, j) + self.coords[n] for bit, n, _
+                                    in neighbours if mask & bit)
+            self.actions[c] = table
+
+    def restrict(self, cells):
+        """Return this geometry with only the given cells iterated over.
+
+        Cells empty in a position never hold a tower again, so a board may
+        skip them, and drop them from the neighbours of the other cells. The
+        action tables are shared with self, which must contain cells.
+        """
+        cells = tuple(cells)
+        if cells == self.cells:
+            return self
+        kept = set(cells)
+        neighbours = list(self.neighbours)
+        for c in cells:
+            neighbours[c] = tuple(t for t in neighbours[c] if t[1] in kept)
+        # Set the attributes in the order of __init__ (rather than copying
+        # __dict__) so that attribute lookups stay as fast as on self.
+        geometry = Geometry.__new__(Geometry)
+        geometry.rows = self.rows
+        geometry.columns = self.columns
+        geometry.cells = cells
+        geometry.coords = self.coords
+        geometry.offsets = self.offsets
+        geometry.neighbours = neighbours
+        geometry.actions = self.actions
+        geometry.symmetric = self.symmetric
+        return geometry
+
+
+_geometries = {}
+
+
+def get_geometry(rows, columns, cells):
+    """Return the (cached) Geometry of the given playable cells."""
+    key = (rows, columns, tuple(cells))
+    geometry = _geometries.get(key)
+    if geometry is None:
+        geometry = _geometries[key] = Geometry(rows, columns, cells)
+    return geometry
+
+
+_initial_cells = {}
+
+
+def playable_cells(cells, columns):
+    """Return the cells that can hold a tower on a board of cells.
+
+    Cells empty in the position may have been emptied by a move: as long as
+    the towers lie on cells of the initial board of the same dimensions, its
+    cells are used, so that every position of a game shares the tables of
+    one Geometry.
+    """
+    shape = (len(cells), columns)
+    initial = _initial_cells.get(shape)
+    if initial is None:
+        initial = ()
+        board = Board.initial_board
+        if len(board) * len(board[0]) == len(cells) and \
+                len(board[0]) == columns:
+            initial = tuple(c for c, x in enumerate(
+                x for row in board for x in row) if x)
+        _initial_cells[shape] = initial
+    towers = [c for c, x in enumerate(cells) if x]
+    if set(towers).issubset(initial):
+        return initial
+    return towers
+
+
+class FastBoard(Board):
+
+    """Avalam board with incremental move generation.
+
+    Besides the attributes of Board, a FastBoard has:
+    cells -- flat list of the signed heights, cells[i * columns + j] is
+        m[i][j]
+    masks -- masks[c] has the bit 1 << d set when the tower on c can be
+        moved in direction DIRECTIONS[d] (and conversely)
+    n_moves -- number of legal actions
+    tower_diff -- number of towers of PLAYER1 minus those of PLAYER2
+    full_diff -- same as tower_diff for towers of maximal height
+    n_movable -- number of towers that can still be moved
+    secured -- secured[player] is the number of frozen towers of player
+        (PLAYER1 or PLAYER2, used as an index): towers that cannot be moved
+        nor covered anymore, either of maximal height or without movable
+        neighbour. They are kept until the end of the game.
+    key -- 64-bit Zobrist key of the position, XOR of zobrist[c][cells[c]]
+        over all cells and of ZOBRIST_SIDE when PLAYER2 is to move
+    player -- the player to move, switched after every move (set_player
+        changes it along with the key)
+    sym_keys -- the Zobrist keys (without ZOBRIST_SIDE) of the position, of
+        the position rotated by 180 degrees, and of both with the colours
+        swapped (see canonical_key), or None until canonical_key is first
+        called: only then are they kept up to date by the moves
+
+    """
+
+    def __init__(self, percepts=Board.initial_board,
+                 max_height=Board.max_height, invert=False, player=1):
+        Board.__init__(self, percepts, max_height, invert)
+        self.player = player
+        self.cells = [x for row in self.m for x in row]
+        towers = tuple(c for c, x in enumerate(self.cells) if x)
+        self.geometry = get_geometry(
+            self.rows, self.columns,
+            playable_cells(self.cells, self.columns)).restrict(towers)
+        self.masks = [0] * len(self.cells)
+        self.n_moves = 0
+        self.tower_diff = 0
+        self.full_diff = 0
+        # All the masks are empty: every tower starts frozen, _relink thaws
+        # the movable ones
+        self.n_movable = 0
+        self.secured = [0, 0, 0]
+        for c in self.geometry.cells:
+            self.secured[1 if self.cells[c] > 0 else -1] += 1
+        self.zobrist = get_zobrist_table(len(self.cells), self.max_height)
+        self.key = 0
+        self.sym_keys = None
+        for c in self.geometry.cells:
+            x = self.cells[c]
+            self._count(x, 1)
+            self.key ^= self.zobrist[c][x]
+            self._relink(c)
+        if player < 0:
+            self.key ^= ZOBRIST_SIDE
+
+    def clone(self):
+        """Return a clone of this object."""
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other.m = [row[:] for row in self.m]
+        other.cells = self.cells[:]
+        other.masks = self.masks[:]
+        other.secured = self.secured[:]
+        if self.sym_keys is not None:
+            other.sym_keys = self.sym_keys[:]
+        other.undo_stack = []
+        return other
+
+    def _count(self, x, sign):
+        """Add (sign=1) or remove (sign=-1) tower x from the score counters."""
+        if x > 0:
+            self.tower_diff += sign
+            if x == self.max_height:
+                self.full_diff += sign
+        elif x < 0:
+            self.tower_diff -= sign
+            if x == -self.max_height:
+                self.full_diff -= sign
+
+    def _set(self, c, x):
+        """Put tower x on cell c, leaving the masks untouched."""
+        old = self.cells[c]
+        self._count(old, -1)
+        self._count(x, 1)
+        if self.masks[c]:
+            self.n_movable += (x != 0) - (old != 0)
+        else:
+            if old:
+                self.secured[1 if old > 0 else -1] -= 1
+            if x:
+                self.secured[1 if x > 0 else -1] += 1
+        z = self.zobrist[c]
+        self.key ^= z[old] ^ z[x]
+        keys = self.sym_keys
+        if keys is not None:
+            r = self.zobrist[len(self.cells) - 1 - c]
+            keys[0] ^= z[old] ^ z[x]
+            keys[1] ^= r[old] ^ r[x]
+            keys[2] ^= z[-old] ^ z[-x]
+            keys[3] ^= r[-old] ^ r[-x]
+        self.cells[c] = x
+        i, j = self.geometry.coords[c]
+        self.m[i][j] = x
+
+    def _relink(self, c):
+        """Recompute the moves between cell c and its neighbours.
+
+        The towers whose mask becomes (or stops being) empty are frozen (or
+        thawed), so only the 3x3 neighbourhood of c is looked at.
+
+        """
+        cells = self.cells
+        masks = self.masks
+        h = abs(cells[c])
+        room = self.max_height - h
+        mask = 0
+        for bit, n, back_bit in self.geometry.neighbours[c]:
+            x = cells[n]
+            old = masks[n]
+            if h and x and abs(x) <= room:
+                mask |= bit
+                new = old | back_bit
+            else:
+                new = old & ~back_bit
+            if new != old:
+                masks[n] = new
+                if x and (not old or not new):
+                    self._freeze(x, not new)
+        old = masks[c]
+        self.n_moves += 2 * (POPCOUNT[mask] - POPCOUNT[old])
+        masks[c] = mask
+        if h and (not old) != (not mask):
+            self._freeze(cells[c], not mask)
+
+    def _freeze(self, x, frozen):
+        """Count tower x as frozen (frozen=True) or movable again."""
+        sign = 1 if frozen else -1
+        self.secured[1 if x > 0 else -1] += sign
+        self.n_movable -= sign
+
+    def _move(self, a, b):
+        """Move the tower on cell a onto cell b (no validity check)."""
+        xa = self.cells[a]
+        h = abs(xa) + abs(self.cells[b])
+        self._set(a, 0)
+        self._set(b, -h if xa < 0 else h)
+        self._relink(a)
+        self._relink(b)
+        self.key ^= ZOBRIST_SIDE
+        self.player = -self.player
+
+    def _cell_direction(self, action):
+        """Return (c, d) with action moving cell c in direction d.
+
+        Raise KeyError, IndexError, TypeError or ValueError for actions
+        that do not move a tower of the board toward one of its neighbours.
+
+        """
+        i1, j1, i2, j2 = action
+        if not (0 <= i1 < self.rows and 0 <= j1 < self.columns):
+            raise IndexError(action)
+        return i1 * self.columns + j1, DIRECTION_INDEX[(i2 - i1, j2 - j1)]
+
+    def is_action_valid(self, action):
+        """Return whether action is a valid action."""
+        try:
+            c, d = self._cell_direction(action)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+        return bool(self.masks[c] >> d & 1)
+
+    def get_tower_actions(self, i, j):
+        """Yield all actions with moving tower (i,j)"""
+        c = i * self.columns + j
+        mask = self.masks[c]
+        if mask:
+            yield from self.geometry.actions[c][mask]
+
+    def is_tower_movable(self, i, j):
+        """Return wether tower (i,j) is movable"""
+        return self.masks[i * self.columns + j] != 0
+
+    def is_tower_frozen(self, i, j):
+        """Return whether there is a tower on (i,j) that will stay there
+        until the end of the game."""
+        c = i * self.columns + j
+        return self.cells[c] != 0 and self.masks[c] == 0
+
+    def secured_diff(self):
+        """Return the number of frozen towers of PLAYER1 minus those of
+        PLAYER2."""
+        return self.secured[1] - self.secured[-1]
+
+    def count_movable_towers(self):
+        """Return the number of towers that can still be moved.
+
+        Every move takes one of them off the board, so the game lasts at
+        most count_movable_towers() - 1 more plies.
+
+        """
+        return self.n_movable
+
+    def get_regions(self):
+        """Return the independent regions of the board (see
+        Board.get_regions)."""
+        masks = self.masks
+        coords = self.geometry.coords
+        neighbours = self.geometry.neighbours
+        regions = []
+        seen = set()
+        for c in self.geometry.cells:
+            if not masks[c] or c in seen:
+                continue
+            seen.add(c)
+            region = []
+            stack = [c]
+            while stack:
+                a = stack.pop()
+                region.append(coords[a])
+                mask = masks[a]
+                for bit, n, _ in neighbours[a]:
+                    if mask & bit and n not in seen:
+                        seen.add(n)
+                        stack.append(n)
+            regions.append(region)
+        return regions
+
+    def get_actions(self):
+        """Yield all valid actions on this board."""
+        masks = self.masks
+        actions = self.geometry.actions
+        for c in self.geometry.cells:
+            mask = masks[c]
+            if mask:
+                yield from actions[c][mask]
+
+    def random_action(self, rng=random):
+        """Return a legal action drawn uniformly (the board must not be
+        finished).
+
+        Arguments:
+        rng -- the random.Random instance to use
+
+        """
+        r = rng.randrange(self.n_moves)
+        masks = self.masks
+        for c in self.geometry.cells:
+            mask = masks[c]
+            if mask:
+                k = POPCOUNT[mask]
+                if r < k:
+                    return self.geometry.actions[c][mask][r]
+                r -= k
+
+    def forcing_actions(self, player):
+        """Return the actions of player leaving a tower of player frozen at
+        once: those completing a tower of max_height, and those capturing a
+        tower of the opponent so that the result has no neighbour left to
+        be merged with."""
+        cells = self.cells
+        masks = self.masks
+        max_height = self.max_height
+        geometry = self.geometry
+        neighbours = geometry.neighbours
+        forcing = []
+        for c in geometry.cells:
+            mask = masks[c]
+            x = cells[c]
+            if not mask or x * player < 0:
+                continue
+            h = abs(x)
+            for bit, n, _ in neighbours[c]:
+                if mask & bit:
+                    y = cells[n]
+                    room = max_height - h - abs(y)
+                    if room == 0 or y * player < 0 and not any(
+                            m != c and cells[m] and abs(cells[m]) <= room
+                            for _, m, _ in neighbours[n]):
+                        forcing.append(geometry.actions[c][bit][0])
+        return forcing
+
+    def play_action(self, action):
+        """Play an action if it is valid.
+
+        An action is a 4-uple containing the row and column of the tower to
+        move and the row and column of the tower to gobble. If the action is
+        invalid, raise an InvalidAction exception. Return self.
+
+        """
+        try:
+            c, d = self._cell_direction(action)
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise InvalidAction(action)
+        if not self.masks[c] >> d & 1:
+            raise InvalidAction(action)
+        self._move(c, c + self.geometry.offsets[d])
+        return self
+
+    def push(self, action):
+        """Play an action in place, remembering how to undo it with pop().
+
+        If the action is invalid, raise an InvalidAction exception. Return
+        self.
+
+        """
+        try:
+            c, d = self._cell_direction(action)
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise InvalidAction(action)
+        if not self.masks[c] >> d & 1:
+            raise InvalidAction(action)
+        b = c + self.geometry.offsets[d]
+        self.undo_stack.append((c, self.cells[c], b, self.cells[b]))
+        self._move(c, b)
+        return self
+
+    def pop(self):
+        """Undo the last action played with push(). Return self."""
+        a, xa, b, xb = self.undo_stack.pop()
+        self._set(a, xa)
+        self._set(b, xb)
+        self._relink(a)
+        self._relink(b)
+        self.key ^= ZOBRIST_SIDE
+        self.player = -self.player
+        return self
+
+    def set_player(self, player):
+        """Make player the side to move, updating the key. Return self."""
+        if player != self.player:
+            self.key ^= ZOBRIST_SIDE
+            self.player = player
+        return self
+
+    def canonical_key(self):
+        """Return the key of the position under its symmetries.
+
+        The position is seen by the player to move (colours swapped when
+        PLAYER2 is to move, which keeps the value of the position for the
+        player to move) and, on a symmetric board, the smallest key of it
+        and of its rotation by 180 degrees is chosen. Return a pair
+        (key, rotated) where rotated tells whether the rotated position was
+        chosen: actions stored under that key are then given for the
+        rotated board (see rotate_action).
+
+        """
+        keys = self.sym_keys
+        if keys is None:
+            keys = self.sym_keys = self._symmetric_keys()
+        if self.player > 0:
+            key, rotated = keys[0], keys[1]
+        else:
+            key, rotated = keys[2], keys[3]
+        if rotated < key and self.geometry.symmetric:
+            return rotated, True
+        return key, False
+
+    def _symmetric_keys(self):
+        """Return the value of sym_keys computed from the cells."""
+        keys = [0, 0, 0, 0]
+        last = len(self.cells) - 1
+        for c in self.geometry.cells:
+            x = self.cells[c]
+            keys[0] ^= self.zobrist[c][x]
+            keys[1] ^= self.zobrist[last - c][x]
+            keys[2] ^= self.zobrist[c][-x]
+            keys[3] ^= self.zobrist[last - c][-x]
+        return keys
+
+    def rotate_action(self, action):
+        """Return action rotated by 180 degrees."""
+        i1, j1, i2, j2 = action
+        rows = self.rows - 1
+        columns = self.columns - 1
+        return (rows - i1, columns - j1, rows - i2, columns - j2)
+
+    def is_finished(self):
+        """Return whether no more moves can be made (i.e., game finished)."""
+        return self.n_moves == 0
+
+    def get_score(self):
+        """Return a score for this board.
+
+        The score is the difference between the number of towers of each
+        player. In case of ties, it is the difference between the maximal
+        height towers of each player. If self.is_finished() returns True,
+        this score represents the winner (<0: red, >0: yellow, 0: draw).
+
+        """
+        return self.tower_diff or self.full_diff
+
+
+def find_action(board, percepts):
+    """Return the action leading from board to percepts.
+
+    Return None if percepts cannot be reached from board in one action.
+
+    """
+    source = destination = None
+    for i, (row, new_row) in enumerate(zip(board.m, percepts)):
+        for j, (x, y) in enumerate(zip(row, new_row)):
+            if x == y:
+                continue
+            if y == 0 and source is None:
+                source = (i, j)
+            elif destination is None:
+                destination = (i, j)
+            else:
+                return None
+    if source is None or destination is None:
+        return None
+    action = source + destination
+    if not board.is_action_valid(action):
+        return None
+    i, j = destination
+    board.push(action)
+    reached = board.m[i][j] == percepts[i][j]
+    board.pop()
+    return action if reached else None
+
+
+def dict_to_fast_board(dictio, player=1):
+    """Return a FastBoard built from a board encoded as a dictionary, with
+    player to move."""
+    return FastBoard(dictio['m'], dictio['max_height'], player=player)
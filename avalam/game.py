@@ -195,8 +195,32 @@ class Trace:
 
 
 def load_trace(f):
-    """Load a trace from a file."""
-    return pickle.load(f)
+    """Load the next trace of a file, either pickled by Trace.write or in
+    the compact format of trace_file.py (f must then be seekable)."""
+    import trace_file
+    offset = f.tell()
+    if offset == 0 and f.read(4) == trace_file.MAGIC:
+        offset = trace_file.HEADER.size
+    f.seek(offset)
+    if f.read(2) != trace_file.MARKER:
+        f.seek(offset)
+        return pickle.load(f)
+    f.seek(offset)
+    size = trace_file.RECORD.size
+    head = f.read(size)
+    # The record is decoded once all of it has been read
+    while True:
+        try:
+            game, end = trace_file.decode_game(head, 0)
+        except EOFError:
+            more = f.read(size)
+            if not more:
+                raise
+            head += more
+            size *= 2
+        else:
+            f.seek(offset + end)
+            return trace_file.game_to_trace(game)
 
 
 class Game:
@@ -326,7 +350,12 @@ class Game:
 
 
 def connect_agent(uri):
-    """Connect to a remote player and return a proxy for the Player object."""
+    """Connect to a remote player and return a proxy for the Player object.
+    URIs avalam://host:port use the binary transport of binary_rpc.py,
+    the others XML-RPC."""
+    import binary_rpc
+    if uri.startswith(binary_rpc.SCHEME):
+        return binary_rpc.BinaryAgentProxy(uri)
     return xmlrpc.client.ServerProxy(uri, allow_none=True)
 
 
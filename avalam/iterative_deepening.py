@@ -0,0 +1,139 @@
+"""
+Iterative deepening and time management for the Avalam agents.
+
+The agents get the time credit left to them (time_left) at every step. A
+budget is allocated to the current move from an estimate of the number of
+moves we still have to play, and the search is run with increasing depths
+until the budget is spent. The search itself polls a Deadline and raises
+SearchTimeout as soon as the budget is exceeded, in which case the result
+of the last completed depth is used.
+
+"""
+import math
+import time
+
+# Seconds kept aside for the network round trips and the unexpected.
+SAFETY_MARGIN = 1.0
+# Never spend more than this fraction of the remaining credit on one move.
+MAX_FRACTION = 0.5
+# Stop deepening once this fraction of the budget is used: the next
+# iteration would most likely not finish in time.
+SOFT_FRACTION = 0.5
+
+
+class SearchTimeout(Exception):
+
+    """Raised inside a search when its deadline has passed."""
+
+
+def remaining_plies(n_actions, step, max_plies=47):
+    """Return an estimate of the number of plies left in the game.
+
+    Over random games, the number of plies left is close to
+    2 * sqrt(n_actions) - 1. A game of standard Avalam has at most 47 plies
+    (every move removes a tower), which bounds the estimate from step.
+
+    Arguments:
+    n_actions -- number of legal actions in the current position
+    step -- the current step number, starting from 1
+    max_plies -- maximal length of a game
+
+    """
+    estimate = 2 * math.sqrt(n_actions) - 1
+    return max(1, min(estimate, max_plies - step + 1))
+
+
+def move_budget(time_left, step, n_actions):
+    """Return the number of seconds to spend on this move.
+
+    Return None for untimed games (time_left is None).
+
+    Arguments:
+    time_left -- time credit left to the agent, in seconds
+    step -- the current step number, starting from 1
+    n_actions -- number of legal actions in the current position
+
+    """
+    if time_left is None:
+        return None
+    usable = max(0.0, time_left - SAFETY_MARGIN)
+    moves_left = math.ceil(remaining_plies(n_actions, step) / 2)
+    return min(usable / moves_left, MAX_FRACTION * usable)
+
+
+class Deadline:
+
+    """Clock polled by a search at every node.
+
+    The clock is only read every period calls to check() to keep its cost
+    negligible. nodes counts the calls to check() since the creation.
+
+    """
+
+    def __init__(self, budget=None, period=256):
+        """Start the clock.
+
+        Arguments:
+        budget -- number of seconds before expiration (None for no limit)
+        period -- number of checks between two readings of the clock
+
+        """
+        self.start = time.time()
+        self.budget = budget
+        self.end = None if budget is None else self.start + budget
+        self.period = period
+        self.nodes = 0
+
+    def check(self):
+        """Count a node, raise SearchTimeout if the deadline has passed."""
+        self.nodes += 1
+        if self.end is not None and not self.nodes % self.period and \
+                time.time() > self.end:
+            raise SearchTimeout
+
+    def elapsed(self):
+        """Return the number of seconds since the creation."""
+        return time.time() - self.start
+
+    def soft_expired(self):
+        """Return whether starting a new iteration is a waste of time."""
+        return self.budget is not None and \
+            self.elapsed() > SOFT_FRACTION * self.budget
+
+
+def iterative_deepening(search, max_depth, deadline, board=None, min_depth=1,
+                        stats=None):
+    """Run search with increasing depths until max_depth or the deadline.
+
+    Return a triplet (value, action, depth) for the deepest completed
+    iteration, or (None, None, 0) if not even min_depth could be completed.
+
+    Arguments:
+    search -- function taking a depth and returning a (value, action) pair,
+        raising SearchTimeout when the deadline is reached
+    max_depth -- maximal depth to search
+    deadline -- the Deadline polled by search
+    board -- the board searched in place with push()/pop(), restored to its
+        initial state when an iteration is interrupted (None if the search
+        does not modify a shared board)
+    min_depth -- depth of the first iteration
+    stats -- the SearchStats told about each completed iteration (None if
+        disabled)
+
+    """
+    result = (None, None, 0)
+    undo_depth = None if board is None else len(board.undo_stack)
+    for depth in range(min_depth, max_depth + 1):
+        try:
+            value, action = search(depth)
+        except SearchTimeout:
+            if board is not None:
+                while len(board.undo_stack) > undo_depth:
+                    board.pop()
+            break
+        result = (value, action, depth)
+        if stats is not None:
+            stats.iteration(depth)
+        if deadline.soft_expired():
+            break
+    return result
@@ -0,0 +1,165 @@
+"""
+Lazy SMP search for the negamax agent with a transposition table.
+
+Helper processes search the same root as the main process, at staggered
+depths, and all of them share one SharedTranspositionTable. The helpers do
+not communicate otherwise: the entries they leave in the table are what
+speeds up the main search, whose result is the one played. A second small
+shared memory block holds the id of the running search; the helpers stop as
+soon as it changes.
+
+Agents using it provide negamax(board, action, player, depth, origDepth,
+alpha, beta, color, tt) as in negamax_ab_tt_player, use self.tt as their
+table (the shared one passed through wrap_table(table) in the helpers) and
+poll self.deadline (an iterative_deepening.Deadline). The agents of the
+helpers are configured as the agent searching (see
+parallel_search.agent_settings).
+
+"""
+import concurrent.futures
+import contextlib
+import math
+import time
+from multiprocessing import shared_memory
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, iterative_deepening, SearchTimeout
+from parallel_search import new_agent
+from transposition_table import SharedTranspositionTable
+
+_agent = None
+_shm = None
+_control = None
+
+
+class SharedDeadline(Deadline):
+
+    """Deadline that also expires when the search id in shared memory
+    changes."""
+
+    def __init__(self, budget, control, search_id, period=256):
+        Deadline.__init__(self, budget, period)
+        self.control = control
+        self.search_id = search_id
+
+    def check(self):
+        self.nodes += 1
+        if not self.nodes % self.period and (
+                self.control[0] != self.search_id or
+                (self.end is not None and time.time() > self.end)):
+            raise SearchTimeout
+
+    def soft_expired(self):
+        return False
+
+
+def _init_helper(agent_class, settings, tt_name, control_name):
+    """Create the agent of a helper process and attach the shared memory."""
+    global _agent, _shm, _control
+    _agent = new_agent(agent_class, settings, tt_name)
+    _shm = shared_memory.SharedMemory(name=control_name)
+    _control = _shm.buf.cast("Q")
+
+
+def _ready():
+    return True
+
+
+def _help(percepts, max_height, player, max_depth, end, index, search_id,
+          generation):
+    """Search the root with iterative deepening until told to stop.
+
+    Helper index starts at depth 2 + index % 2 (at most max_depth), ahead of
+    the main search starting at depth 1, so that the helpers do not all
+    search the same depth at the same time. Return the statistics of
+    the helper.
+
+    """
+    board = FastBoard(percepts, max_height, player=player)
+    tt = _agent.tt
+    tt.generation = generation
+    tt.reset_counters()
+    _agent.orderer.new_search()
+    _agent.deadline = SharedDeadline(
+        None if end is None else end - time.time(), _control, search_id)
+    _, _, depth = iterative_deepening(
+        lambda depth: _agent.negamax(board, None, player, depth, depth,
+                                     -math.inf, math.inf, 1, tt),
+        max_depth, _agent.deadline, board,
+        min_depth=min(max_depth, 2 + index % 2))
+    stats = tt.stats()
+    stats.update(worker=index + 1, nodes=_agent.deadline.nodes, depth=depth)
+    return stats
+
+
+class LazySMPSearch:
+
+    """Helper processes sharing a transposition table with an agent."""
+
+    def __init__(self, agent_class, helpers, tt_bytes=64 << 20,
+                 settings=None, tt=None):
+        """Create the shared table and fork the helpers.
+
+        Arguments:
+        agent_class -- class of the agent, instantiated in every helper
+        helpers -- number of helper processes
+        tt_bytes -- size of the shared transposition table
+        settings -- the settings of the agents of the helpers (see
+            parallel_search.agent_settings, None for the defaults of
+            agent_class)
+        tt -- the SharedTranspositionTable of the agent, used instead of a
+            new one of tt_bytes (and not closed by close)
+
+        """
+        self.helpers = helpers
+        self.owns_tt = tt is None
+        self.tt = SharedTranspositionTable(tt_bytes) if tt is None else tt
+        self.search_id = 0
+        self.shm = shared_memory.SharedMemory(create=True, size=8)
+        self.control = self.shm.buf.cast("Q")
+        self.control[0] = 0
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=helpers, initializer=_init_helper,
+            initargs=(agent_class, settings or {}, self.tt.name,
+                      self.shm.name))
+        for future in [self.pool.submit(_ready) for _ in range(helpers)]:
+            future.result()
+        self.last_stats = []
+
+    @contextlib.contextmanager
+    def helping(self, board, player, max_depth, deadline):
+        """Run the helpers on board while the body of the with statement
+        searches it. The statistics of the helpers are left in
+        self.last_stats."""
+        self.search_id += 1
+        self.control[0] = self.search_id
+        percepts = board.get_percepts()
+        futures = [
+            self.pool.submit(_help, percepts, board.max_height, player,
+                             max_depth, deadline.end, i, self.search_id,
+                             self.tt.generation)
+            for i in range(self.helpers)
+        ]
+        try:
+            yield self
+        finally:
+            # Nothing is left to stop once closed (e.g. at exit while
+            # pondering)
+            if self.pool is not None:
+                self.control[0] = 0
+                self.last_stats = [future.result() for future in futures]
+
+    def close(self):
+        """Stop the helpers and release the shared memory (once only: the
+        later calls do nothing)."""
+        if self.pool is None:
+            return
+        # Stop the running search, if any, rather than wait for its end
+        self.control[0] = 0
+        self.pool.shutdown()
+        self.pool = None
+        self.control.release()
+        self.shm.close()
+        self.shm.unlink()
+        if self.owns_tt:
+            self.tt.close()
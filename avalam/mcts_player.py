@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo Tree Search Avalam agent.
+Copyright (C) 2022, <<<<<<<<<<< YOUR NAMES HERE >>>>>>>>>>>
+Polytechnique Montréal
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; version 2 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+import math
+import random
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from avalam import *
+from batch_eval import evaluate_batch, expand_children, random_playouts
+from fast_board import FastBoard, dict_to_fast_board, find_action
+from iterative_deepening import Deadline, SearchTimeout, move_budget
+from transposition_table import pack_action, unpack_action
+
+Action = Tuple[int, int, int, int]
+
+
+class Tree:
+
+    """Search tree stored in parallel numpy arrays.
+
+    Node n has been visited visits[n] times and values[n] is the sum of the
+    rewards of these visits for the player who played the move leading to n
+    (move[n], packed with pack_action). The children of n are the count[n]
+    nodes starting at first[n] (-1 while n is not expanded). Nodes are
+    allocated sequentially; once capacity is reached, no more nodes are
+    expanded.
+
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.first = np.full(capacity, -1, dtype=np.int32)
+        self.count = np.zeros(capacity, dtype=np.int16)
+        self.move = np.zeros(capacity, dtype=np.uint16)
+        self.size = 1  # node 0 is the initial root
+
+    def expand(self, node: int, actions: List[Action]) -> bool:
+        """Create the children of node, return False if the tree is full."""
+        n = len(actions)
+        if self.size + n > self.capacity:
+            return False
+        start = self.size
+        self.move[start:start + n] = [pack_action(a) for a in actions]
+        self.visits[start:start + n] = 0
+        self.values[start:start + n] = 0.0
+        self.first[start:start + n] = -1
+        self.count[start:start + n] = 0
+        self.first[node] = start
+        self.count[node] = n
+        self.size += n
+        return True
+
+    def children(self, node: int) -> range:
+        start = self.first[node]
+        return range(start, start + self.count[node])
+
+    def child(self, node: int, action: Action) -> Optional[int]:
+        """Return the child of node reached by action, if expanded."""
+        if self.first[node] < 0:
+            return None
+        packed = pack_action(action)
+        start = self.first[node]
+        moves = self.move[start:start + self.count[node]]
+        found = np.flatnonzero(moves == packed)
+        return int(start + found[0]) if len(found) else None
+
+
+class MCTSAgent(Agent):
+
+    """Agent implementing Monte Carlo Tree Search (UCT) with random
+    playouts."""
+
+    # Exploration constant of UCB1
+    exploration = 1.4
+    # Random playouts run from every new leaf, one after the other on the
+    # FastBoard, or all at once on numpy arrays (batch_eval.random_playouts)
+    # if batch_playouts
+    playouts_per_leaf = 4
+    batch_playouts = False
+    # Score the children of a node in one batch_eval call at expansion, so
+    # that the unvisited ones are tried best first (else in random order)
+    order_children = True
+    # Iterations per move when the game is not timed
+    iterations = 1000
+    # Maximal number of nodes of the tree
+    capacity = 1 << 20
+    # Opening book (see agent_main)
+    book = None
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.tree = None
+        self.root = 0
+        # Board after our last move, and its node
+        self.last_board = None
+        self.last_node = None
+
+    def play(
+        self,
+        percepts: List[List[int]],
+        player: int,
+        step: int,
+        time_left: Optional[float] = None
+    ) -> Action:
+        board = dict_to_fast_board(percepts, player)
+        if self.book is not None:
+            next_action = self.book.probe(board, player)
+            if next_action is not None:
+                print("Book move played: ", next_action)
+                # The tree does not follow the game any more
+                self.last_board = None
+                return next_action
+        self.reuse_tree(board)
+        self.np_rng = np.random.default_rng(self.rng.getrandbits(64))
+        # Leaves are only expanded once visited: expand the root at once so
+        # that even a single iteration leaves a move to choose from
+        if self.tree.first[self.root] < 0:
+            self.expand(self.root, board)
+        deadline = Deadline(move_budget(time_left, step, board.n_moves), period=8)
+
+        iterations = playouts = 0
+        try:
+            while time_left is not None or iterations < self.iterations:
+                deadline.check()
+                playouts += self.iterate(board, player)
+                iterations += 1
+        except SearchTimeout:
+            pass
+
+        tree = self.tree
+        children = tree.children(self.root)
+        if len(children):
+            best = children[int(np.argmax(tree.visits[children.start:children.stop]))]
+            next_action = unpack_action(int(tree.move[best]))
+        else:
+            # The tree was full
+            best = None
+            next_action = next(board.get_actions())
+
+        seconds = deadline.elapsed()
+        print("iterations:", iterations, "playouts:", playouts,
+              "playouts/s:", round(playouts / seconds) if seconds else 0,
+              "nodes:", tree.size)
+        print("Action played: ", next_action)
+        board.play_action(next_action)
+        self.last_board = None if best is None else board
+        self.last_node = best
+        return next_action
+
+    def reuse_tree(self, board: FastBoard) -> None:
+        """Make the root of the tree the node of board.
+
+        The subtree is kept when board follows our previous move and the
+        reply of the opponent has been expanded; otherwise (or when the tree
+        is more than half full) a new tree is started.
+        """
+        node = None
+        if self.last_board is not None:
+            action = find_action(self.last_board, board.m)
+            if action is not None:
+                node = self.tree.child(self.last_node, action)
+        if node is None or self.tree.size > self.capacity // 2:
+            self.tree = Tree(self.capacity)
+            node = 0
+        self.root = node
+
+    def iterate(self, board: FastBoard, player: int) -> int:
+        """Run one selection, expansion, playout and backpropagation step
+        from the root. Return the number of playouts run."""
+        tree = self.tree
+        node = self.root
+        path = [node]
+        movers = [-player]
+        to_play = player
+        c = self.exploration
+
+        # Selection
+        while tree.first[node] >= 0 and tree.count[node] > 0:
+            start = tree.first[node]
+            stop = start + tree.count[node]
+            visits = tree.visits[start:stop]
+            unvisited = np.flatnonzero(visits == 0)
+            if len(unvisited):
+                node = start + int(unvisited[0])
+            else:
+                ucb = tree.values[start:stop] / visits + \
+                    c * np.sqrt(math.log(tree.visits[node]) / visits)
+                node = start + int(np.argmax(ucb))
+            board.push(unpack_action(int(tree.move[node])))
+            path.append(node)
+            movers.append(to_play)
+            to_play = -to_play
+            if tree.visits[node] == 0:
+                break
+
+        # Expansion
+        if tree.visits[node] > 0 and not board.is_finished():
+            self.expand(node, board)
+
+        # Playouts
+        if self.batch_playouts:
+            total = int(random_playouts(board.m, self.playouts_per_leaf, self.np_rng,
+                                        board.max_height).sum())
+        else:
+            total = 0
+            for _ in range(self.playouts_per_leaf):
+                total += self.playout(board)
+
+        # Backpropagation
+        n = self.playouts_per_leaf
+        tree.visits[path] += n
+        tree.values[path] += total * np.array(movers, dtype=np.float64)
+        for _ in range(len(path) - 1):
+            board.pop()
+        return n
+
+    def expand(self, node: int, board: FastBoard) -> None:
+        """Create the children of node, the node of board, best first
+        for the side to move if order_children (ties in random order)."""
+        actions = list(board.get_actions())
+        self.rng.shuffle(actions)
+        if self.order_children and actions:
+            features = evaluate_batch(expand_children(board.m, actions), board.max_height)
+            isolated = features["isolated"]
+            scores = (features["score"] + isolated[:, 0] - isolated[:, 1]) * board.player
+            actions = [actions[k] for k in np.argsort(-scores, kind="stable")]
+        self.tree.expand(node, actions)
+
+    def playout(self, board: FastBoard) -> int:
+        """Play random moves until the end of the game and return the
+        winner (1 for PLAYER1, -1 for PLAYER2, 0 for a draw)."""
+        depth = 0
+        rng = self.rng
+        while board.n_moves:
+            board.push(board.random_action(rng))
+            depth += 1
+        score = board.get_score()
+        for _ in range(depth):
+            board.pop()
+        return (score > 0) - (score < 0)
+
+
+if __name__ == "__main__":
+    agent_main(MCTSAgent())
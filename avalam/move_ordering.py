@@ -0,0 +1,125 @@
+"""
+Move ordering for the alpha-beta agents.
+
+Alpha-beta prunes the most when the best move of every node is searched
+first. MoveOrderer sorts the actions of a node by, in that order:
+1. the move given by the caller (transposition table or principal variation
+   move);
+2. a static score: moves completing a tower of maximal height of the side
+   to move, then moves putting a tower of the side to move on a tower of
+   the opponent;
+3. the killer moves of the ply: the last two moves that caused a beta
+   cutoff at the same distance from the root;
+4. the history score of the move, indexed by its (from, to) cell pair and
+   increased by depth * depth at every beta cutoff.
+
+One MoveOrderer can be shared by any agent searching with push()/pop(): it
+only needs the board of the node, the side to move and the ply.
+
+"""
+
+# Maximal number of plies of a search
+MAX_PLY = 64
+
+# Sort keys of the ordering categories, above any history score
+_FIRST = 1 << 40
+_COMPLETE = 3 << 32
+_CAPTURE = 2 << 32
+_KILLER = (1 << 31, 1 << 30)
+
+
+class MoveOrderer:
+
+    """Killer moves, history table and static move ordering."""
+
+    def __init__(self, rows=9, columns=9, max_ply=MAX_PLY, enabled=True):
+        """Create empty tables.
+
+        Arguments:
+        rows, columns -- dimensions of the boards to search
+        max_ply -- maximal number of plies of a search
+        enabled -- when False, order() only puts the given move first and
+            nothing is learned (the behaviour of the agents before move
+            ordering, kept for comparisons)
+
+        """
+        self.columns = columns
+        self.cells = rows * columns
+        self.max_ply = max_ply
+        self.enabled = enabled
+        self.clear()
+
+    def clear(self):
+        """Forget everything (new game)."""
+        self.killers = [[None, None] for _ in range(self.max_ply + 1)]
+        self.history = [0] * (self.cells * self.cells)
+
+    def new_search(self):
+        """Prepare for the search of a new root.
+
+        The killers are relative to the root and are dropped; the history
+        scores are halved so that recent cutoffs weigh more.
+
+        """
+        for slots in self.killers:
+            slots[0] = slots[1] = None
+        self.history = [h >> 1 for h in self.history]
+
+    def _index(self, action):
+        i1, j1, i2, j2 = action
+        columns = self.columns
+        return (i1 * columns + j1) * self.cells + i2 * columns + j2
+
+    def order(self, board, player, ply, first=None):
+        """Return the list of the actions of board, best expected first.
+
+        Arguments:
+        board -- the board of the node
+        player -- the side to move (PLAYER1 or PLAYER2)
+        ply -- distance of the node from the root
+        first -- move to search first if it is legal (or None)
+
+        """
+        actions = list(board.get_actions())
+        if not self.enabled:
+            if first is not None and first in actions:
+                actions.remove(first)
+                actions.insert(0, first)
+            return actions
+        m = board.m
+        max_height = board.max_height
+        killer0, killer1 = self.killers[min(ply, self.max_ply)]
+        history = self.history
+        columns = self.columns
+        cells = self.cells
+
+        def key(action):
+            if action == first:
+                return _FIRST
+            i1, j1, i2, j2 = action
+            x = m[i1][j1] * player
+            if x > 0:
+                y = m[i2][j2] * player
+                if x + abs(y) == max_height:
+                    return _COMPLETE
+                if y < 0:
+                    return _CAPTURE
+            if action == killer0:
+                return _KILLER[0]
+            if action == killer1:
+                return _KILLER[1]
+            return history[(i1 * columns + j1) * cells + i2 * columns + j2]
+
+        actions.sort(key=key, reverse=True)
+        return actions
+
+    def cutoff(self, action, ply, depth):
+        """Record that action caused a beta cutoff at ply, with depth plies
+        left to search."""
+        if not self.enabled:
+            return
+        slots = self.killers[min(ply, self.max_ply)]
+        if slots[0] != action:
+            slots[1] = slots[0]
+            slots[0] = action
+        self.history[self._index(action)] += depth * depth
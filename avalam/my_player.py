@@ -19,7 +19,10 @@ along with this program; if not, see <http://www.gnu.org/licenses/>.
 """
 import math
 from avalam import *
-from typing import Callable, Tuple, List, Optional
+from fast_board import dict_to_fast_board
+from iterative_deepening import Deadline, iterative_deepening, move_budget
+from move_ordering import MoveOrderer
+from typing import Callable, Tuple, List, Optional, Sequence
 import random
 
 
@@ -46,6 +49,21 @@ class MinMaxAgent(Agent):
 
     """Agent implementing a basic min-max algorithm."""
 
+    # Depth searched when the game is not timed
+    depth = 4
+    # Nodes searched at most by the quiescence search of a leaf, over the
+    # moves freezing a tower of the side to move (0 to evaluate the leaves
+    # as they are)
+    quiescence_nodes = 32
+    # Search statistics written after each move (see search_stats.py and
+    # agent_main)
+    stats = None
+
+    def __init__(self, orderer: Optional[MoveOrderer] = None):
+        self.orderer = MoveOrderer() if orderer is None else orderer
+        self.deadline = Deadline()
+        self.pv = []
+
     def initialize(
         self, 
         percepts: List[List[int]], 
@@ -90,16 +108,32 @@ class MinMaxAgent(Agent):
         print("step:", step)
         print("time left:", time_left if time_left else '+inf')
 
-        board = dict_to_board(percepts)
-
-        next_action = self.alpha_beta_search(board, player, step, time_left, self.cutoff, self.heuristic)[1]
+        board = dict_to_fast_board(percepts)
+
+        self.deadline = Deadline(move_budget(time_left, step, board.n_moves))
+        max_depth = self.depth if time_left is None else board.count_movable_towers() - 1
+        self.pv = []
+        self.orderer.new_search()
+        if self.stats is not None:
+            self.stats.start_move(step, player)
+
+        def search(depth: int) -> Tuple[int, Action]:
+            return self.alpha_beta_search(board, player, step, time_left, self.cutoff, self.heuristic, depth, self.pv)
+
+        value, next_action, depth = iterative_deepening(search, max(1, max_depth), self.deadline, board,
+                                                       stats=self.stats)
+        if next_action is None:
+            next_action = next(board.get_actions())
+        if self.stats is not None:
+            self.stats.emit(next_action, depth)
+        print("depth:", depth, "nodes:", self.deadline.nodes, "time:", round(self.deadline.elapsed(), 3))
         print("Action played: ", next_action)
         return next_action
     
 
     def cutoff(self, depth: int, time_left: Optional[float]) -> bool:
-        if time_left is not None and time_left == 0:
-            return True
+        # Raises SearchTimeout once the budget of this move is spent
+        self.deadline.check()
         return depth == 0
     
 
@@ -194,9 +228,11 @@ class MinMaxAgent(Agent):
         #Get the score for the board
         score = board.get_score()
 
-        clone = board.clone()
+        #Frozen towers stay until the end: count them a second time
+        score += board.secured_diff()
+
         x, y, dx, dy = action
-        origin, dest = clone.m[x][y], clone.m[dx][dy]
+        origin, dest = board.m[x][y], board.m[dx][dy]
 
         #Get score for making a tower
         score += self._compute_tower_score(origin,dest,player)
@@ -226,8 +262,64 @@ class MinMaxAgent(Agent):
         step: int,
         time_left: Optional[float],
         cutoff: Callable[[int], bool],
-        heuristic: Callable[[Board], int]
+        heuristic: Callable[[Board], int],
+        max_depth: int = 4,
+        pv: Sequence[Action] = (),
     ) -> Tuple[int, Action]:
+        """Search board up to max_depth and return a (value, action) pair.
+
+        The moves of pv (the principal variation of the previous iteration)
+        are tried first along that variation. The principal variation found
+        is left in self.pv.
+        """
+        # pv_table[ply] is the principal variation from the node at ply
+        pv_table = [[] for _ in range(max_depth + 2)]
+
+        orderer = self.orderer
+        stats = self.stats
+
+        def ordered_actions(board: Board, player: int, ply: int, on_pv: bool):
+            return orderer.order(board, player, ply, pv[ply] if on_pv and ply < len(pv) else None)
+
+        def quiesce(
+            board: Board,
+            to_move: int,
+            action: Action,
+            alpha: float,
+            beta: float,
+            step: int,
+            ply: int,
+        ) -> float:
+            """Return the value of a leaf for to_move (the opposite of the
+            heuristic if to_move is the opponent) once the moves freezing a
+            tower of to_move are played out (see
+            FastBoard.forcing_actions). to_move may stand pat on the
+            heuristic instead, and the search stops at the node budget of
+            the leaf, self.qnodes_left."""
+            stand_pat = heuristic(board, player, action, 0, step)
+            if to_move != player:
+                stand_pat = -stand_pat
+            if stand_pat >= beta or self.qnodes_left <= 0:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            for action in board.forcing_actions(to_move):
+                if self.qnodes_left <= 0:
+                    break
+                self.qnodes_left -= 1
+                self.deadline.check()
+                if stats is not None:
+                    stats.node(ply + 1)
+                    stats.qnode(ply + 1)
+                value = -quiesce(board.push(action), -to_move, action, -beta, -alpha, step + 1, ply + 1)
+                board.pop()
+                if value > stand_pat:
+                    stand_pat = value
+                    if value > alpha:
+                        alpha = value
+                        if alpha >= beta:
+                            break
+            return stand_pat
+
         def max_value(
             board: Board,
             player: int,
@@ -237,22 +329,35 @@ class MinMaxAgent(Agent):
             depth: int,
             action: Action,
             step: int,
+            on_pv: bool,
         ) -> Tuple[int, Optional[Action]]:
+            ply = max_depth - depth
+            pv_table[ply] = []
+            if stats is not None:
+                stats.node(ply)
             if cutoff(depth, time_left):
-                return (heuristic(board, player, action, depth, step), None)
+                self.qnodes_left = self.quiescence_nodes
+                return (quiesce(board, player, action, alpha, beta, step, ply), None)
             if board.is_finished():
                 return (board.get_score(), None)
 
             v_star = -math.inf
             m_star = None
 
-            for action in board.get_actions():
-                v_child = min_value(board.clone().play_action(action), player, time_left, alpha, beta, depth - 1, action, step + 1)[0]
+            actions = ordered_actions(board, player, ply, on_pv)
+            for action in actions:
+                child_on_pv = on_pv and ply < len(pv) and action == pv[ply]
+                v_child = min_value(board.push(action), player, time_left, alpha, beta, depth - 1, action, step + 1, child_on_pv)[0]
+                board.pop()
                 if v_child > v_star:
                     v_star = v_child
                     m_star = action
+                    pv_table[ply] = [action] + pv_table[ply + 1]
                     alpha = max(alpha, v_star)
                 if v_star >= beta:
+                    orderer.cutoff(action, ply, depth)
+                    if stats is not None:
+                        stats.cutoff(action == actions[0])
                     break
             return (v_star, m_star)
         
@@ -266,27 +371,42 @@ class MinMaxAgent(Agent):
             depth: int,
             action : Action,
             step: int,
+            on_pv: bool,
         ) -> Tuple[int, Optional[Action]]:
+            ply = max_depth - depth
+            pv_table[ply] = []
+            if stats is not None:
+                stats.node(ply)
             if cutoff(depth, time_left):
-                return (heuristic(board, player, action, depth, step), None)
+                self.qnodes_left = self.quiescence_nodes
+                return (-quiesce(board, -player, action, -beta, -alpha, step, ply), None)
             if board.is_finished():
                 return (board.get_score(), None)
             
             v_star = math.inf
             m_star = None
 
-            for action in board.get_actions():
-                v_child = max_value(board.clone().play_action(action), player, time_left, alpha, beta, depth - 1, action, step + 1)[0]
+            actions = ordered_actions(board, -player, ply, on_pv)
+            for action in actions:
+                child_on_pv = on_pv and ply < len(pv) and action == pv[ply]
+                v_child = max_value(board.push(action), player, time_left, alpha, beta, depth - 1, action, step + 1, child_on_pv)[0]
+                board.pop()
                 if v_child < v_star:
                     v_star = v_child
                     m_star = action
+                    pv_table[ply] = [action] + pv_table[ply + 1]
                     beta = min(beta, v_star)
                 if v_star <= alpha:
+                    orderer.cutoff(action, ply, depth)
+                    if stats is not None:
+                        stats.cutoff(action == actions[0])
                     break
             return (v_star, m_star)
 
         
-        return max_value(board, player, time_left, -math.inf, math.inf, 4, [0,2,0,3], step)
+        result = max_value(board, player, time_left, -math.inf, math.inf, max_depth, [0,2,0,3], step, True)
+        self.pv = pv_table[0]
+        return result
     
 
 if __name__ == "__main__":
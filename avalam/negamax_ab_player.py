@@ -17,17 +17,53 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 """
+import atexit
 import math
 from avalam import *
+from fast_board import dict_to_fast_board
+from iterative_deepening import Deadline, iterative_deepening, move_budget
+from move_ordering import MoveOrderer
+from parallel_search import RootSplitSearch, agent_settings
+from position_cache import PositionCache
 from typing import Callable, Tuple, List, Optional
 import random
 
 Action = Tuple[int, int, int, int]
 
+# Maximal number of plies of a search
+MAX_PLY = 64
+
 class NegaMaxAgent(Agent):
 
     """Agent implementing a basic min-max algorithm."""
 
+    # Depth searched when the game is not timed
+    depth = 4
+    # Number of processes searching the root moves (see agent_main)
+    workers = 1
+    # Endgame tablebase probed during the search and opening book (see
+    # agent_main)
+    tablebase = None
+    book = None
+    # Nodes searched at most by the quiescence search of a leaf, over the
+    # moves freezing a tower of the side to move (0 to evaluate the leaves
+    # as they are)
+    quiescence_nodes = 32
+    # Search statistics written after each move (see search_stats.py and
+    # agent_main)
+    stats = None
+
+    def __init__(self, orderer: Optional[MoveOrderer] = None):
+        self.orderer = MoveOrderer() if orderer is None else orderer
+        self.splitter = None
+        self.deadline = Deadline()
+        self.pv = []
+        # Position after our last move and the rest of the principal
+        # variation from it
+        self.cache = PositionCache()
+        # pv_table[ply] is the principal variation from the node at ply
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+
     def initialize(
         self, 
         percepts: List[List[int]], 
@@ -56,13 +92,77 @@ class NegaMaxAgent(Agent):
     ) -> Action:
         print("player:", player)
         print("time left:", time_left if time_left else '+inf')
-        board = dict_to_board(percepts)
-
-        next_action = self.negamax(board, None, player, 4, -math.inf, math.inf)[1]
-
+        board = dict_to_fast_board(percepts, player)
+        if self.book is not None:
+            next_action = self.book.probe(board, player)
+            if next_action is not None:
+                print("Book move played: ", next_action)
+                return next_action
+
+        self.deadline = Deadline(move_budget(time_left, step, board.n_moves))
+        max_depth = self.depth if time_left is None else board.count_movable_towers() - 1
+        # The previous principal variation is tried first if the opponent
+        # has played its reply
+        self.pv = self.cache.follow(board) or []
+        self.orderer.new_search()
+        if self.stats is not None:
+            self.stats.start_move(step, player)
+
+        value, next_action, depth = iterative_deepening(
+            lambda depth: self.search(board, player, depth),
+            max(1, max_depth), self.deadline, board, stats=self.stats,
+        )
+        if next_action is None:
+            next_action = next(board.get_actions())
+        if self.stats is not None:
+            self.stats.emit(next_action, depth)
+
+        print("depth:", depth, "nodes:", self.deadline.nodes, "time:", round(self.deadline.elapsed(), 3),
+              "predicted:", self.cache.hits, "/", self.cache.hits + self.cache.misses)
         print("Action played: ", next_action)
+        if len(self.pv) > 1 and self.pv[0] == next_action:
+            self.cache.remember(board.push(next_action), self.pv[1:])
+            board.pop()
         return next_action
 
+    def search(
+        self,
+        board: Board,
+        player: int,
+        depth: int,
+    ):
+        """Search board to depth, trying the previous principal variation
+        first, and leave the new principal variation in self.pv."""
+        if self.workers > 1:
+            if self.splitter is None:
+                self.splitter = RootSplitSearch(type(self), self.workers,
+                                                settings=agent_settings(self))
+                atexit.register(self.splitter.close)
+            result = self.splitter.search(self, board, player, depth)
+            self.pv = [result[1]]
+            return result
+        result = self.negamax(board, None, player, depth, -math.inf, math.inf, 0, True)
+        self.pv = self.pv_table[0][:]
+        return result
+
+    def root_actions(self, board: Board, player: int) -> List[Action]:
+        """Return the root moves, the previous best move first."""
+        return self.orderer.order(board, player, 0, self.pv[0] if self.pv else None)
+
+    def search_child(
+        self,
+        board: Board,
+        action: Action,
+        player: int,
+        depth: int,
+        alpha: float,
+        beta: float,
+    ) -> float:
+        """Return the value of root move action searched to depth."""
+        value = -self.negamax(board.push(action), action, -player, depth - 1, -beta, -alpha, 1)[0]
+        board.pop()
+        return value
+
     def negamax(
         self, 
         board: Board,
@@ -71,29 +171,86 @@ class NegaMaxAgent(Agent):
         depth: int,
         alpha: float, 
         beta: float,
+        ply: int = 0,
+        on_pv: bool = False,
     ):
-        if depth == 0 or board.is_finished():
+        self.deadline.check()
+        self.pv_table[ply] = []
+        stats = self.stats
+        if stats is not None:
+            stats.node(ply)
+        if self.tablebase is not None and ply > 0:
+            final = self.tablebase.probe(board, player)
+            if final is not None:
+                return (self.final_value(final, player, depth), action)
+        if board.is_finished():
             return (self.heuristic(board, player, action, depth), action)
+        if depth == 0:
+            self.qnodes_left = self.quiescence_nodes
+            return (self.quiesce(board, action, player, alpha, beta, ply), action)
         
-        actions = list(board.get_actions())
+        pv_move = self.pv[ply] if on_pv and ply < len(self.pv) else None
+        actions = self.orderer.order(board, player, ply, pv_move)
 
         v_star = -math.inf
         m_star = actions[0]
 
         for action in actions:
-            move_alpha = -self.negamax(board.clone().play_action(action), action, -player, depth - 1, -beta, -alpha)[0]
+            child_on_pv = on_pv and ply < len(self.pv) and action == self.pv[ply]
+            move_alpha = -self.negamax(board.push(action), action, -player, depth - 1, -beta, -alpha, ply + 1, child_on_pv)[0]
+            board.pop()
 
             if v_star < move_alpha:
                 v_star = move_alpha
                 m_star = action
+                self.pv_table[ply] = [action] + self.pv_table[ply + 1]
 
             if alpha < move_alpha:
                 alpha = move_alpha
                 if alpha >= beta:
+                    self.orderer.cutoff(action, ply, depth)
+                    if stats is not None:
+                        stats.cutoff(action == actions[0])
                     break
 
         return (v_star, m_star)
 
+    def quiesce(
+        self,
+        board: Board,
+        action: Action,
+        player: int,
+        alpha: float,
+        beta: float,
+        ply: int,
+    ) -> float:
+        """Return the value of a leaf for player once the moves freezing a
+        tower of player are played out (see FastBoard.forcing_actions).
+        player may stand pat on the heuristic instead, and the search stops
+        at the node budget of the leaf, self.qnodes_left."""
+        stand_pat = self.heuristic(board, player, action, 0)
+        if stand_pat >= beta or self.qnodes_left <= 0:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        stats = self.stats
+        for action in board.forcing_actions(player):
+            if self.qnodes_left <= 0:
+                break
+            self.qnodes_left -= 1
+            self.deadline.check()
+            if stats is not None:
+                stats.node(ply + 1)
+                stats.qnode(ply + 1)
+            value = -self.quiesce(board.push(action), action, -player, -beta, -alpha, ply + 1)
+            board.pop()
+            if value > stand_pat:
+                stand_pat = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        return stand_pat
+
     def heuristic(
         self,
         board: Board,
@@ -106,9 +263,11 @@ class NegaMaxAgent(Agent):
         #Get the score for the board
         score = board.get_score()
 
-        clone = board.clone()
+        #Frozen towers stay until the end: count them a second time
+        score += board.secured_diff()
+
         x, y, dx, dy = action
-        origin, dest = clone.m[x][y], clone.m[dx][dy]
+        origin, dest = board.m[x][y], board.m[dx][dy]
 
         #Get score for making a tower
         score += self._compute_tower_score(origin,dest,player)
@@ -126,6 +285,12 @@ class NegaMaxAgent(Agent):
         score *= (1 + 0.001 * depth)
 
         return score * player
+
+    def final_value(self, final: Tuple[int, int], player: int, depth: int) -> float:
+        """Return the heuristic of the final position with the given
+        (tower_diff, full_diff), as returned by a tablebase probe."""
+        tower_diff, full_diff = final
+        return ((tower_diff or full_diff) + tower_diff) * (1 + 0.001 * depth) * player
         
 
     def _compute_tower_score(self, origin: int, dest: int, player: int) -> int:        
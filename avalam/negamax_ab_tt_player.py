@@ -17,9 +17,19 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 """
+import atexit
+import contextlib
 import math
 from avalam import *
-from transposition_table import BoardWithTransposition
+from fast_board import dict_to_fast_board
+from iterative_deepening import Deadline, SearchTimeout, SOFT_FRACTION, iterative_deepening, move_budget
+from lazy_smp import LazySMPSearch
+from move_ordering import MoveOrderer
+from parallel_search import RootSplitSearch, agent_settings
+from position_cache import PositionCache
+from regions import RegionSolver
+from symmetry import CanonicalTable
+from transposition_table import BucketTranspositionTable, PersistentTable, SharedTranspositionTable
 from typing import Tuple, List, Optional
 
 LOWERBOUND, EXACT, UPPERBOUND = -1, 0, 1
@@ -30,6 +40,66 @@ class NegaMaxAgent(Agent):
 
     """Agent implementing a basic min-max algorithm."""
 
+    # Depth searched when the game is not timed
+    depth = 5
+    # Number of search processes and how they cooperate (see agent_main)
+    workers = 1
+    parallel = "split"
+    # Search the moves after the first one with a null window first
+    pvs = True
+    # Half-width of the window searched around the value of the previous
+    # iteration (0 for a full window)
+    aspiration = 2
+    # Endgame tablebase probed during the search and opening book (see
+    # agent_main)
+    tablebase = None
+    book = None
+    # Solve the game exactly once at most this many towers can be moved
+    endgame_towers = 12
+    # Share the table entries of symmetric positions (see symmetry.py)
+    symmetry = True
+    # Nodes searched at most by the quiescence search of a leaf, over the
+    # moves freezing a tower of the side to move (0 to evaluate the leaves
+    # as they are)
+    quiescence_nodes = 32
+    # Search statistics written after each move (see search_stats.py and
+    # agent_main)
+    stats = None
+    # Table file warm-starting the search, into which the results searched
+    # at least merge_depth deep are merged after each game (see agent_main)
+    tt_file = None
+    merge_depth = 4
+    # Search the position left to the opponent during its turn, for at most
+    # ponder_time seconds, in helper processes sharing the table, so that
+    # every reply finds its subtree in the table (see agent_main). The
+    # statistics of a game are printed when the next one begins.
+    ponder = False
+    ponder_time = 30.0
+
+    def __init__(self, tt_bytes: int = 64 << 20, orderer: Optional[MoveOrderer] = None, tt=None):
+        """Search with a table of tt_bytes, or with tt if not None (the
+        table shared by the processes of a parallel search)."""
+        self.tt_bytes = tt_bytes
+        self.tt = self.wrap_table(BucketTranspositionTable(tt_bytes) if tt is None else tt)
+        self.orderer = MoveOrderer() if orderer is None else orderer
+        self.splitter = None
+        self.shared = None
+        self.lazy = None
+        self.persistent = None
+        self.cache = PositionCache()
+        self.pondering = None
+        self.ponder_deadline = None
+        # Seconds spent pondering and searching in the current game
+        self.pondered = 0.0
+        self.searched = 0.0
+        # Step of the last call of play (0 after initialize), to notice the
+        # start of a game: game.Game does not call initialize
+        self.last_step = None
+        self.deadline = Deadline()
+        # The solved states are kept from one move to the next, and cleared
+        # at the start of each game (see new_game)
+        self.endgame = RegionSolver(check=lambda: self.deadline.check())
+
     def initialize(
         self, 
         percepts: List[List[int]], 
@@ -46,8 +116,28 @@ class NegaMaxAgent(Agent):
             credit for this agent (all players taken together). If the game is
             not time-limited, time_left is None.
         """
-        pass
-    
+        self.new_game()
+        self.last_step = 0
+
+    def new_game(self) -> None:
+        """Prepare a new game: forget the endgame states solved in the
+        previous one, report its pondering, and open the table file or
+        merge its results into it."""
+        self.stop_pondering()
+        self.endgame.states.clear()
+        if self.ponder:
+            self.report_pondering()
+        if self.tt_file is None:
+            return
+        if self.persistent is None:
+            table = BucketTranspositionTable(self.tt_bytes) if self.shared is None else self.shared
+            self.persistent = PersistentTable(table, self.tt_file, self.merge_depth, self.tt_bytes)
+            self.tt = self.wrap_table(self.persistent)
+            atexit.register(self.persistent.merge, True)
+        else:
+            # The results of the previous game
+            self.persistent.merge()
+
 
     def play(
         self, 
@@ -57,14 +147,191 @@ class NegaMaxAgent(Agent):
         time_left: Optional[float] = None
     ) -> Action:
         print("time left:", time_left if time_left else '+inf')
-        board = dict_to_board(percepts)
-        board.__class__ = BoardWithTransposition
+        board = dict_to_fast_board(percepts, player)
+        if self.last_step is None or step <= self.last_step:
+            self.new_game()
+        self.last_step = step
+        self.stop_pondering()
+        started = Deadline()
+        if self.cache.follow(board) is not None:
+            print("predicted position, ponder hits:", self.cache.hits, "/", self.cache.hits + self.cache.misses)
+        if self.book is not None:
+            next_action = self.book.probe(board, player)
+            if next_action is not None:
+                print("Book move played: ", next_action)
+                return next_action
+        self.tt.new_search()
+        self.orderer.new_search()
+
+        budget = move_budget(time_left, step, board.n_moves)
+        if board.count_movable_towers() <= self.endgame_towers:
+            # Leave the rest of the budget to the search if solving fails
+            self.deadline = Deadline(None if budget is None else SOFT_FRACTION * budget)
+            try:
+                final, next_action = self.endgame.solve_board(board, player)
+                print("endgame solved:", final, "states:", len(self.endgame.states))
+                print("Action played: ", next_action)
+                return next_action
+            except SearchTimeout:
+                if budget is not None:
+                    budget -= self.deadline.elapsed()
+
+        self.deadline = Deadline(budget)
+        max_depth = self.depth if time_left is None else board.count_movable_towers() - 1
+        if self.stats is not None:
+            self.stats.start_move(step, player)
 
-        next_action = self.negamax(board, None, player, 5, -math.inf, math.inf, 1)[1]
+        # The principal variation of each iteration is kept in the
+        # transposition table and its moves are tried first by the next one.
+        if self.workers > 1 and self.parallel == "lazy":
+            helping = self.shared_search().helping(board, player, max(1, max_depth), self.deadline)
+        else:
+            helping = contextlib.nullcontext()
+
+        with helping:
+            value, next_action, depth = iterative_deepening(
+                lambda depth: self.search(board, player, depth),
+                max(1, max_depth), self.deadline, board, stats=self.stats,
+            )
+        if next_action is None:
+            next_action = next(board.get_actions())
+        if self.stats is not None:
+            self.stats.emit(next_action, depth)
 
+        print("depth:", depth, "nodes:", self.deadline.nodes, "time:", round(self.deadline.elapsed(), 3))
+        if self.lazy is not None:
+            for stats in self.lazy.last_stats:
+                print("helper {worker}: depth {depth} nodes {nodes} tt hit rate {hit_rate:.2f}".format(**stats))
         print("Action played: ", next_action)
+        if self.ponder:
+            self.searched += started.elapsed()
+            self.start_pondering(board, player, next_action)
         return next_action
 
+    def shared_search(self) -> LazySMPSearch:
+        """Return the lazy SMP helpers, started on first use, searching
+        with the shared table."""
+        if self.lazy is None:
+            self.lazy = LazySMPSearch(
+                type(self), max(1, self.workers - 1), settings=agent_settings(self), tt=self.shared_table())
+            atexit.register(self.lazy.close)
+        return self.lazy
+
+    def shared_table(self) -> SharedTranspositionTable:
+        """Return the table shared with the root-split workers and the lazy
+        SMP helpers, created on first use: it then replaces the table of the
+        agent."""
+        if self.shared is None:
+            self.shared = SharedTranspositionTable(self.tt_bytes)
+            atexit.register(self.shared.close)
+            if self.persistent is not None:
+                self.persistent.set_table(self.shared)
+                self.tt = self.wrap_table(self.persistent)
+            else:
+                self.tt = self.wrap_table(self.shared)
+        return self.shared
+
+    def start_pondering(self, board: Board, player: int, action: Action) -> None:
+        """Let the helpers search the position after action, for the
+        opponent, until the next call of play."""
+        board.push(action)
+        lookup = self.tt.lookup(board)
+        if lookup is not None and lookup["move"] is not None:
+            self.cache.remember(board, [lookup["move"]])
+        self.ponder_deadline = Deadline(self.ponder_time)
+        self.pondering = self.shared_search().helping(
+            board, -player, max(1, board.count_movable_towers()), self.ponder_deadline)
+        self.pondering.__enter__()
+        board.pop()
+
+    def stop_pondering(self) -> None:
+        """Stop the helpers started by start_pondering."""
+        if self.pondering is not None:
+            self.pondering.__exit__(None, None, None)
+            self.pondering = None
+            self.pondered += min(self.ponder_deadline.elapsed(), self.ponder_time)
+            for stats in self.lazy.last_stats:
+                print("ponder {worker}: depth {depth} nodes {nodes}".format(**stats))
+            self.lazy.last_stats = []
+
+    def report_pondering(self) -> None:
+        """Print the pondering statistics of the game that ended and reset
+        them. The searches played without pondering (book moves and solved
+        endgames) are not counted."""
+        if self.cache.hits + self.cache.misses:
+            print("ponder hit rate: {:.2f} ({} / {}), pondered: {:.1f}s, searched: {:.1f}s".format(
+                self.cache.hit_rate(), self.cache.hits, self.cache.hits + self.cache.misses,
+                self.pondered, self.searched))
+        self.cache = PositionCache()
+        self.pondered = 0.0
+        self.searched = 0.0
+
+    def wrap_table(self, table):
+        """Return the transposition table used for table."""
+        return CanonicalTable(table) if self.symmetry else table
+
+    def search(
+        self,
+        board: Board,
+        player: int,
+        depth: int,
+    ):
+        """Search board to depth, splitting the root moves among processes
+        if self.workers > 1 (lazy SMP helpers are started by play)."""
+        # The keys of the table are those of the side to move
+        board.set_player(player)
+        if self.workers > 1 and self.parallel == "split":
+            if self.splitter is None:
+                self.splitter = RootSplitSearch(
+                    type(self), self.workers, settings=agent_settings(self), tt=self.shared_table())
+                atexit.register(self.splitter.close)
+            value, action = self.splitter.search(self, board, player, depth)
+            self.tt.store(game=board, depth=depth, value=value, move=action, flag=EXACT)
+            return value, action
+        return self.aspiration_search(board, player, depth)
+
+    def aspiration_search(
+        self,
+        board: Board,
+        player: int,
+        depth: int,
+    ):
+        """Search board to depth in a window around the exact value left in
+        the table by the previous iteration, widening the side that fails."""
+        lookup = self.tt.lookup(board)
+        if not self.aspiration or lookup is None or lookup["flag"] != EXACT:
+            return self.negamax(board, None, player, depth, depth, -math.inf, math.inf, 1, self.tt)
+        alpha = lookup["value"] - self.aspiration
+        beta = lookup["value"] + self.aspiration
+        while True:
+            value, action = self.negamax(board, None, player, depth, depth, alpha, beta, 1, self.tt)
+            if value <= alpha:
+                alpha = -math.inf
+            elif value >= beta:
+                beta = math.inf
+            else:
+                return value, action
+
+    def root_actions(self, board: Board, player: int) -> List[Action]:
+        """Return the root moves, the move of the table first."""
+        lookup = self.tt.lookup(board)
+        return self.orderer.order(board, player, 0, None if lookup is None else lookup["move"])
+
+    def search_child(
+        self,
+        board: Board,
+        action: Action,
+        player: int,
+        depth: int,
+        alpha: float,
+        beta: float,
+    ) -> float:
+        """Return the value of root move action searched to depth."""
+        board.push(action)
+        value = -self.negamax(board, action, player, depth - 1, depth, -beta, -alpha, -1, self.tt)[0]
+        board.pop()
+        return value
+
     def negamax(
         self, 
         board: Board,
@@ -77,85 +344,134 @@ class NegaMaxAgent(Agent):
         color: int,
         tt=None,
     ):
-        alphaOrig = alpha
-
-        lookup = None if (tt is None) else tt.lookup(board)
+        self.deadline.check()
+        stats = self.stats
+        if stats is not None:
+            stats.node(origDepth - depth)
 
-        if lookup is not None:
-            # Game has been visited in the past
-            if lookup["depth"] >= depth:
-                flag, value = lookup["flag"], lookup["value"]
-                if flag == EXACT:
-                    if depth == origDepth:
-                        # TODO: Idk how this works...
-                        move = lookup["move"]
-                    return value, action
-                elif flag == LOWERBOUND:
-                    alpha = max(alpha, value)
-                elif flag == UPPERBOUND:
-                    beta = min(beta, value)
-
-                if alpha >= beta:
-                    if depth == origDepth:
-                        move = lookup["move"]
-                    return value, action
+        if self.tablebase is not None and depth < origDepth:
+            final = self.tablebase.probe(board, player * color)
+            if final is not None:
+                return (self.final_value(final, player) * color, action)
 
         if depth == 0 or board.is_finished():
             # Depth represents the depth left to recurse into, the smaller
             # it is the deeper we are in the tree.
             # We could probably add 0.001 * depth to signify that victories
             # in less turns have more value than victories in more turns.
-            return (self.heuristic(board, player) * color, action)
+            self.qnodes_left = self.quiescence_nodes
+            return (self.quiesce(board, player, alpha, beta, color, origDepth), action)
 
-        if lookup is not None:
-            # Put the supposedly best move first in the list
-            actions = list(board.get_actions())
-            actions.remove(lookup["move"])
-            actions = [lookup["move"]] + actions
-        else:
-            actions = list(board.get_actions())
+        lookup = None if (tt is None) else tt.lookup(board)
+        if stats is not None and tt is not None:
+            stats.probe(lookup is not None)
+
+        if lookup is not None and lookup["depth"] >= depth and depth < origDepth:
+            # Game has been visited in the past (the root is always searched
+            # so that a move is returned)
+            flag, value = lookup["flag"], lookup["value"]
+            if flag == EXACT:
+                return value, lookup["move"]
+            elif flag == LOWERBOUND:
+                alpha = max(alpha, value)
+            elif flag == UPPERBOUND:
+                beta = min(beta, value)
+
+            if alpha >= beta:
+                return value, lookup["move"]
+
+        # The bounds stored below are relative to the window searched, once
+        # narrowed by the table
+        alphaOrig = alpha
+        # The supposedly best move of the table is searched first
+        ply = origDepth - depth
+        actions = self.orderer.order(board, player * color, ply, None if lookup is None else lookup["move"])
 
-        state = board
         best_move = actions[0]
-        if depth == origDepth:
-            # TODO: Assign move to the first action
-            move = actions[0]
-        
-        
         best_value = -math.inf
 
         for action in actions:
-            board = state.clone()
-            board.play_action(action)
-            value, _ = self.negamax(board, action, player, depth - 1, origDepth, -beta, -alpha, -color, tt)
-            value = -value
+            board.push(action)
+            if best_value == -math.inf or alpha == -math.inf or not self.pvs:
+                value = -self.negamax(board, action, player, depth - 1, origDepth, -beta, -alpha, -color, tt)[0]
+            else:
+                # The values are integers: (alpha, alpha + 1) is a null
+                # window proving that action is no better than alpha
+                value = -self.negamax(board, action, player, depth - 1, origDepth, -alpha - 1, -alpha, -color, tt)[0]
+                if alpha < value < beta:
+                    value = -self.negamax(board, action, player, depth - 1, origDepth, -beta, -value, -color, tt)[0]
+            board.pop()
             if value > best_value:
                 best_value = value
                 best_move = action
-                if depth == origDepth:
-                    move = action
             alpha = max(alpha, value)
             if alpha >= beta:
+                self.orderer.cutoff(action, ply, depth)
+                if stats is not None:
+                    stats.cutoff(action == actions[0])
                 break
 
         if tt is not None:
-            assert move in actions
             tt.store(
-                board,
-                depth,
-                best_value,
-                best_move,
-                UPPERBOUND if best_value <= alphaOrig else LOWERBOUND if best_value >= beta else EXACT,
+                game=board,
+                depth=depth,
+                value=best_value,
+                move=best_move,
+                flag=UPPERBOUND if best_value <= alphaOrig else LOWERBOUND if best_value >= beta else EXACT,
             )
 
         return (best_value, best_move)
 
+    def quiesce(
+        self,
+        board: Board,
+        player: int,
+        alpha: float,
+        beta: float,
+        color: int,
+        ply: int,
+    ) -> float:
+        """Return the value of a leaf (in the negamax sense of color) once
+        the moves freezing a tower of the side to move are played out
+        (see FastBoard.forcing_actions). The side to move may stand pat on
+        the heuristic instead, and the search stops at the node budget of
+        the leaf, self.qnodes_left."""
+        stand_pat = self.heuristic(board, player) * color
+        if stand_pat >= beta or self.qnodes_left <= 0:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        stats = self.stats
+        for action in board.forcing_actions(player * color):
+            if self.qnodes_left <= 0:
+                break
+            self.qnodes_left -= 1
+            self.deadline.check()
+            if stats is not None:
+                stats.node(ply + 1)
+                stats.qnode(ply + 1)
+            value = -self.quiesce(board.push(action), player, -beta, -alpha, -color, ply + 1)
+            board.pop()
+            if value > stand_pat:
+                stand_pat = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        return stand_pat
+
     def heuristic(
         self,
         board: Board,
         player: int,
     ) -> int:
-        return board.get_score() * player
+        # Frozen towers stay until the end: count them a second time
+        return (board.get_score() + board.secured_diff()) * player
+
+    def final_value(self, final: Tuple[int, int], player: int) -> int:
+        """Return the heuristic of the final position with the given
+        (tower_diff, full_diff), as returned by a tablebase probe."""
+        tower_diff, full_diff = final
+        return ((tower_diff or full_diff) + tower_diff) * player
 
 if __name__ == "__main__":
     agent_main(NegaMaxAgent())
\ No newline at end of file
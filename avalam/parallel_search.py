@@ -0,0 +1,193 @@
+"""
+Parallel root splitting for the negamax agents.
+
+The search of the root moves is split across a pool of pre-forked worker
+processes (threads would not help because of the GIL), following the
+"young brothers wait" idea: the eldest root move (the one the agent expects
+to be best) is searched first with a full window in the main process, then
+the remaining moves are dealt to the workers. The best score found so far is
+published in shared memory so that every worker searches its moves with the
+tightest alpha bound known.
+
+Agents using it provide:
+    root_actions(board, player) -- the root moves, best expected first
+    search_child(board, action, player, depth, alpha, beta) -- the negamax
+        value of action from the root, searched to depth, in the window
+        (alpha, beta)
+and poll self.deadline (an iterative_deepening.Deadline) in their search.
+
+The agents of the workers are configured as the agent searching (see
+agent_settings). An agent with a transposition table can give a
+SharedTranspositionTable to share with its workers, which then take it as
+the tt argument of their constructor instead of creating their own table.
+
+"""
+import concurrent.futures
+import math
+import time
+from multiprocessing import shared_memory
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, SearchTimeout
+from transposition_table import SharedTranspositionTable
+
+# Layout of the shared bounds: [search id, alpha]
+_SEARCH_ID, _ALPHA = 0, 1
+# Settings used by the main process only, not given to the other processes
+MAIN_ONLY = frozenset(("workers", "parallel", "book", "stats", "tt_file",
+                       "ponder", "ponder_time"))
+
+_agent = None
+_shm = None
+_bounds = None
+
+
+def agent_settings(agent):
+    """Return the settings of agent to give to the agents of the other
+    processes: its attributes overriding those of its class (e.g. set by
+    agent_main or scripts/tournament.py), but those of MAIN_ONLY."""
+    return {name: value for name, value in vars(agent).items()
+            if hasattr(type(agent), name) and name not in MAIN_ONLY}
+
+
+def new_agent(agent_class, settings, tt_name=None):
+    """Return an agent of agent_class with the given settings, using the
+    SharedTranspositionTable called tt_name if not None.
+
+    The settings are set before calling the constructor, which may read
+    them (e.g. the symmetry of the TT agent in wrap_table).
+
+    """
+    agent = agent_class.__new__(agent_class)
+    agent.__dict__.update(settings)
+    if tt_name is None:
+        agent.__init__()
+    else:
+        agent.__init__(tt=SharedTranspositionTable(name=tt_name))
+    return agent
+
+
+def _init_worker(agent_class, settings, tt_name, shm_name):
+    """Create the agent of a worker process and attach the shared bounds."""
+    global _agent, _shm, _bounds
+    _agent = new_agent(agent_class, settings, tt_name)
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _bounds = _shm.buf.cast("d")
+
+
+def _ready():
+    return True
+
+
+def _search_moves(percepts, max_height, player, actions, depth, end,
+                  search_id, generation):
+    """Search the given root moves in a worker.
+
+    Return (value, action, exact, nodes) for the best move of actions, where
+    exact tells whether value is exact (it may otherwise be an upper bound
+    below the shared alpha), or None if the deadline was reached.
+
+    """
+    board = FastBoard(percepts, max_height, player=player)
+    if generation is not None:
+        _agent.tt.generation = generation
+    _agent.deadline = Deadline(None if end is None else end - time.time())
+    best = (-math.inf, None, False)
+    try:
+        for action in actions:
+            alpha = best[0]
+            if _bounds[_SEARCH_ID] == search_id:
+                alpha = max(alpha, _bounds[_ALPHA])
+            value = _agent.search_child(board, action, player, depth,
+                                        alpha, math.inf)
+            if value > best[0]:
+                best = (value, action, value > alpha)
+                if value > alpha and _bounds[_SEARCH_ID] == search_id and \
+                        value > _bounds[_ALPHA]:
+                    _bounds[_ALPHA] = value
+    except SearchTimeout:
+        return None
+    return best + (_agent.deadline.nodes, )
+
+
+class RootSplitSearch:
+
+    """Pool of worker processes searching root moves in parallel."""
+
+    def __init__(self, agent_class, workers, chunks_per_worker=4,
+                 settings=None, tt=None):
+        """Fork the workers.
+
+        Arguments:
+        agent_class -- class of the agent, instantiated in every worker
+        workers -- number of worker processes
+        chunks_per_worker -- the root moves are dealt in workers *
+            chunks_per_worker tasks to balance the load
+        settings -- the settings of the agents of the workers (see
+            agent_settings, None for the defaults of agent_class)
+        tt -- the SharedTranspositionTable of the agent searching, shared
+            with the workers (None for agents without a table)
+
+        """
+        self.workers = workers
+        self.tt = tt
+        self.chunks = workers * chunks_per_worker
+        self.search_id = 0
+        self.shm = shared_memory.SharedMemory(create=True, size=16)
+        self.bounds = self.shm.buf.cast("d")
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(agent_class, settings or {},
+                      None if tt is None else tt.name, self.shm.name))
+        # Fork all the workers now rather than during the first search
+        for future in [self.pool.submit(_ready) for _ in range(workers)]:
+            future.result()
+
+    def search(self, agent, board, player, depth):
+        """Search the root of board to depth and return (value, action).
+
+        The number of nodes searched by the workers is added to
+        agent.deadline.nodes. Raise SearchTimeout if the deadline of the
+        agent is reached in any process.
+
+        """
+        actions = agent.root_actions(board, player)
+        eldest = actions[0]
+        alpha = agent.search_child(board, eldest, player, depth,
+                                   -math.inf, math.inf)
+        best_value, best_action = alpha, eldest
+        rest = actions[1:]
+        if not rest:
+            return best_value, best_action
+
+        self.search_id += 1
+        self.bounds[_SEARCH_ID] = self.search_id
+        self.bounds[_ALPHA] = alpha
+        percepts = board.get_percepts()
+        futures = [
+            self.pool.submit(_search_moves, percepts, board.max_height,
+                             player, rest[i::self.chunks], depth,
+                             agent.deadline.end, self.search_id,
+                             None if self.tt is None else self.tt.generation)
+            for i in range(min(self.chunks, len(rest)))
+        ]
+        results = [future.result() for future in futures]
+        self.bounds[_SEARCH_ID] = 0
+        if any(result is None for result in results):
+            raise SearchTimeout
+        for value, action, exact, nodes in results:
+            agent.deadline.nodes += nodes
+            if exact and value > best_value:
+                best_value, best_action = value, action
+        return best_value, best_action
+
+    def close(self):
+        """Stop the workers and release the shared memory (once only: the
+        later calls do nothing)."""
+        if self.pool is None:
+            return
+        self.pool.shutdown()
+        self.pool = None
+        self.bounds.release()
+        self.shm.close()
+        self.shm.unlink()
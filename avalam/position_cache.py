@@ -0,0 +1,54 @@
+"""
+Position left to the opponent by an agent, and the line it expected.
+
+The agents are only given the percepts of the board at every step. Between
+our move and the opponent's reply, the new root is a child of the position
+we left, and it is the one we predicted when the opponent played the reply
+of our principal variation. PositionCache remembers the position after our
+move and the expected line, and follow() diffs the next percepts against it
+(see fast_board.find_action) so that the search results of the expected
+line can be reused.
+
+"""
+from fast_board import find_action
+
+
+class PositionCache:
+
+    """Last position left to the opponent and the expected line from it."""
+
+    def __init__(self):
+        self.board = None
+        self.line = []
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, board, line):
+        """Remember board (a FastBoard, copied) after our move, and the
+        expected line of moves from it, starting with the reply."""
+        self.board = board.clone()
+        self.line = list(line)
+
+    def follow(self, board):
+        """Return the rest of the expected line after the move leading to
+        board from the remembered position, or None if the opponent did not
+        play the expected reply (or board does not follow it). Predictions
+        are counted as hits or misses."""
+        if self.board is None:
+            return None
+        line = None
+        if self.line:
+            reply = find_action(self.board, board.m)
+            if reply is not None and tuple(reply) == tuple(self.line[0]):
+                line = self.line[1:]
+        if line is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.board = None
+        self.line = []
+        return line
+
+    def hit_rate(self):
+        predictions = self.hits + self.misses
+        return self.hits / predictions if predictions else 0.0
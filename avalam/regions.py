@@ -0,0 +1,142 @@
+"""
+Exact endgame solver splitting positions into independent regions.
+
+Board.get_regions() splits the movable towers into regions that will never
+interact (see its documentation). A position is then a sum of independent
+subgames, but not one whose value is the sum of the values of the regions:
+players alternate over the whole board and cannot pass, so the side to move
+may have to play in a region it would rather leave alone, and a region may
+be worth more to whoever has to move there last. RegionSolver therefore
+still searches the regions jointly, but its states are multisets of regions
+(translated to the origin, heights signed for the side to move): all the
+interleavings of the moves of different regions reach the same state, as do
+identical regions in different places, so that the number of states
+searched is about the product of the number of positions of each region
+instead of the number of move sequences.
+
+Values are those of the tablebase module: the best final
+(tower_diff, full_diff) pair for the side to move, encoded by encode_value.
+With a single region, the state is the region itself and the search is a
+plain memoized negamax over it.
+
+"""
+from tablebase import (Solver, canonical, decode_value, encode_value,
+                       movable_towers, tower_moves)
+
+
+def split_regions(towers, max_height):
+    """Return the regions of a {(i, j): h} dictionary of towers as a list
+    of {(i, j): h} dictionaries of movable towers."""
+    edges = {}
+    for a, b in tower_moves(towers, max_height):
+        edges.setdefault(a, []).append(b)
+    regions = []
+    seen = set()
+    for start in edges:
+        if start in seen:
+            continue
+        seen.add(start)
+        region = {}
+        stack = [start]
+        while stack:
+            a = stack.pop()
+            region[a] = towers[a]
+            for b in edges[a]:
+                if b not in seen:
+                    seen.add(b)
+                    stack.append(b)
+        regions.append(region)
+    return regions
+
+
+def _flip(part):
+    """Return part seen by the other player."""
+    return tuple((i, j, -h) for i, j, h in part)
+
+
+class RegionSolver(Solver):
+
+    """Memoized negamax over multisets of independent regions."""
+
+    def __init__(self, max_height=5, check=None):
+        """Create an empty solver.
+
+        Arguments:
+        max_height -- maximal height of a tower
+        check -- function called at every new state, that may raise an
+            exception to interrupt the search (e.g. Deadline.check)
+
+        """
+        Solver.__init__(self, max_height)
+        self.check = check
+        self.states = {}
+
+    def board_state(self, board, player):
+        """Return the state of board with player to move."""
+        m = board.m
+        return tuple(sorted(
+            canonical((i, j, m[i][j] * player) for i, j in region)
+            for region in board.get_regions()))
+
+    def solve_state(self, state):
+        """Return the encoded value of a state (a sorted tuple of canonical
+        regions) for the side to move."""
+        value = self.states.get(state)
+        if value is not None:
+            return value
+        if self.check is not None:
+            self.check()
+        max_height = self.max_height
+        best = None
+        for r, part in enumerate(state):
+            others = tuple(_flip(p) for p in state[:r] + state[r + 1:])
+            towers = {(i, j): h for i, j, h in part}
+            for a, b in tower_moves(towers, max_height):
+                child = dict(towers)
+                h = child.pop(a)
+                sign = 1 if h > 0 else -1
+                child[b] = sign * (abs(h) + abs(child[b]))
+                movable = movable_towers(child, max_height)
+                # The towers frozen by the move are scored right away
+                gained = 0
+                for c, x in child.items():
+                    if c not in movable:
+                        sign = 1 if x > 0 else -1
+                        gained += encode_value(
+                            sign, sign if abs(x) == max_height else 0)
+                flipped = {c: -x for c, x in child.items() if c in movable}
+                regions = tuple(
+                    canonical((i, j, x) for (i, j), x in region.items())
+                    for region in split_regions(flipped, max_height))
+                value = gained - self.solve_state(
+                    tuple(sorted(others + regions)))
+                if best is None or value > best:
+                    best = value
+        if best is None:
+            best = 0
+        self.states[state] = best
+        return best
+
+    def solve_board(self, board, player):
+        """Solve a FastBoard with player to move.
+
+        Return a pair (final, action) where final is the final
+        (tower_diff, full_diff) from the point of view of PLAYER1 under best
+        play, as returned by Tablebase.probe, and action is a best move.
+
+        """
+        best = None
+        secured = board.secured_diff()
+        full = board.full_diff
+        for action in list(board.get_actions()):
+            board.push(action)
+            gained = encode_value((board.secured_diff() - secured) * player,
+                                  (board.full_diff - full) * player)
+            value = gained - self.solve_state(self.board_state(board, -player))
+            board.pop()
+            if best is None or value > best[0]:
+                best = (value, action)
+        value, action = best
+        tower_diff, full_diff = decode_value(value)
+        return (secured + tower_diff * player,
+                full + full_diff * player), action
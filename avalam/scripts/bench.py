@@ -0,0 +1,182 @@
+"""
+Benchmark of move generation and search on fixed positions.
+
+Run from the avalam directory:
+    python -m scripts.bench [--perft-only] [-o run.json] [--compare old.json]
+        [--update-reference]
+
+The positions are the CSV files of positions/ (read by avalam.load_percepts:
+openings, middlegames and endgames reached by random moves from the initial
+board). On each of them:
+- perft: the number of move sequences of the depth given in
+  positions/reference.json, counted with FastBoard push/pop (games ending
+  sooner are not counted). A count differing from the reference is a bug
+  of the move generation and makes the script exit with status 1.
+- search: a fixed-depth search by each agent of SEARCHES playing PLAYER1,
+  the random generators seeded. Its node count is compared to the
+  reference too, but only reported: it changes with the search itself
+  (--update-reference stores the counts of this run).
+Each of them runs in a new process, whose peak RSS is reported along with
+the counts, wall time and nodes per second. -o writes them as JSON, which --compare reads to
+print the change of time and node counts from a previous run.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+from avalam import load_percepts
+from fast_board import FastBoard
+from scripts.tournament import make_agent
+
+POSITIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         "positions")
+REFERENCE = os.path.join(POSITIONS, "reference.json")
+# Agent specifications (see scripts/tournament.py) and their search depths
+SEARCHES = ["minmax,depth=2", "negamax,depth=3", "negamax_tt,depth=4"]
+
+
+def perft(board, depth):
+    """Return the number of sequences of depth moves from board."""
+    if depth == 1:
+        return board.n_moves
+    nodes = 0
+    for action in list(board.get_actions()):
+        nodes += perft(board.push(action), depth - 1)
+        board.pop()
+    return nodes
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of the process in megabytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / (1 << 10)
+
+
+def timed(entry, function, *args):
+    """Run function(*args), returning a node count, and complete entry with
+    it."""
+    start = time.perf_counter()
+    entry["nodes"] = function(*args)
+    seconds = time.perf_counter() - start
+    entry["seconds"] = round(seconds, 6)
+    entry["nps"] = round(entry["nodes"] / seconds) if seconds else None
+    entry["rss_mb"] = round(peak_rss_mb(), 1)
+    return entry
+
+
+def measure(entry, function, *args):
+    """Return entry completed by timed(entry, function, *args) in a new
+    process, so that the peak RSS is that of this run alone."""
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+        return pool.submit(timed, entry, function, *args).result()
+
+
+def board_perft(percepts, depth):
+    """Return perft(board, depth) for the board of percepts."""
+    return perft(FastBoard(percepts), depth)
+
+
+def search(spec, percepts):
+    """Return the number of nodes of the search of spec on percepts."""
+    random.seed(0)
+    agent = make_agent(spec, 0)
+    # The agents report their searches on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.play({"m": percepts, "rows": len(percepts),
+                    "columns": len(percepts[0]), "max_height": 5},
+                   1, 1, None)
+    return agent.deadline.nodes
+
+
+def key(entry):
+    return entry["kind"], entry["position"], entry.get("agent")
+
+
+def compare(entries, path):
+    """Print the change of the entries from those of the run in path."""
+    with open(path) as f:
+        old = {key(entry): entry for entry in json.load(f)["entries"]}
+    print("\nchange from %s" % path)
+    for entry in entries:
+        before = old.get(key(entry))
+        if before is None:
+            continue
+        print("%-6s %-14s %-20s time %+7.1f%%  nodes %+d" % (
+            entry["kind"], entry["position"], entry.get("agent") or "",
+            100 * (entry["seconds"] / before["seconds"] - 1),
+            entry["nodes"] - before["nodes"]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--perft-only", action="store_true")
+    parser.add_argument("-o", "--output", help="JSON file of the results")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="JSON file of a previous run")
+    parser.add_argument("--update-reference", action="store_true",
+                        help="store the search node counts of this run as" +
+                             " the reference")
+    args = parser.parse_args()
+
+    with open(REFERENCE) as f:
+        reference = json.load(f)
+    entries = []
+    failed = False
+    for path in sorted(glob.glob(os.path.join(POSITIONS, "*.csv"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        percepts = load_percepts(path)
+        depth = reference["perft"][name]["depth"]
+        entry = measure({"kind": "perft", "position": name, "depth": depth},
+                        board_perft, percepts, depth)
+        entry["ok"] = entry["nodes"] == reference["perft"][name]["nodes"]
+        failed |= not entry["ok"]
+        entries.append(entry)
+        print("perft  %-14s depth %d %12d nodes %8.3fs %10d nps %7.1f MB %s"
+              % (name, depth, entry["nodes"], entry["seconds"], entry["nps"],
+                 entry["rss_mb"], "ok" if entry["ok"] else "MISMATCH"))
+        if args.perft_only:
+            continue
+        for spec in SEARCHES:
+            entry = measure({"kind": "search", "position": name,
+                             "agent": spec}, search, spec, percepts)
+            expected = reference["search"].get(name, {}).get(spec)
+            entry["ok"] = entry["nodes"] == expected
+            entries.append(entry)
+            print("search %-14s %-20s %10d nodes %8.3fs %10d nps %7.1f MB %s"
+                  % (name, spec, entry["nodes"], entry["seconds"],
+                     entry["nps"], entry["rss_mb"],
+                     "" if entry["ok"] else "changed from %s" % expected))
+
+    if args.update_reference:
+        for entry in entries:
+            if entry["kind"] == "search":
+                reference["search"].setdefault(entry["position"], {})[
+                    entry["agent"]] = entry["nodes"]
+        with open(REFERENCE, "w") as f:
+            json.dump(reference, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(),
+                       "machine": platform.machine(),
+                       "entries": entries}, f, indent=1)
+    if args.compare:
+        compare(entries, args.compare)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
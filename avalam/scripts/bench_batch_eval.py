@@ -0,0 +1,55 @@
+"""
+Throughput of batch_eval.evaluate_batch against per-board Python loops.
+
+Run from the avalam directory:
+    python -m scripts.bench_batch_eval [--positions 3000]
+
+The same random positions are scored with Board.get_score() and
+my_player.player_scores() one board at a time, then with one call to
+evaluate_batch (which also computes the full, isolated and move counts).
+The fast row scores FastBoards built from the same percepts, which also
+count the legal moves. The scores must agree.
+"""
+import argparse
+import time
+
+from avalam import Board
+from batch_eval import evaluate_batch, positions_array
+from fast_board import FastBoard
+from my_player import player_scores
+from scripts.bench_board import sample_positions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positions", type=int, default=3000)
+    args = parser.parse_args()
+
+    percepts = sample_positions(args.positions, plies=(0, 8, 16, 24, 32))
+    boards = [Board(p) for p in percepts]
+
+    start = time.perf_counter()
+    scores = [board.get_score() for board in boards]
+    for board in boards:
+        player_scores(board, 1)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for p in percepts:
+        board = FastBoard(p)
+        board.get_score(), board.n_moves, board.count_movable_towers()
+    fast = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = evaluate_batch(positions_array(percepts))
+    batch = time.perf_counter() - start
+    assert list(features["score"]) == scores, "scores differ"
+
+    print("%-10s %10s %14s" % ("method", "seconds", "positions/s"))
+    print("%-10s %10.3f %14.0f" % ("loop", loop, len(boards) / loop))
+    print("%-10s %10.3f %14.0f" % ("fast", fast, len(boards) / fast))
+    print("%-10s %10.3f %14.0f" % ("batch", batch, len(boards) / batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare the throughput of avalam.Board and fast_board.FastBoard.
+
+Run from the avalam directory:
+    python -m scripts.bench_board [--depth 2] [--positions 3]
+
+For each position, every board class walks the full move tree to the given
+depth (clone, play_action, get_actions at every node) and the number of
+visited nodes per second is reported, followed by the raw get_actions rate.
+"""
+import argparse
+import random
+import time
+
+from avalam import Board
+from fast_board import FastBoard
+
+
+def sample_positions(count, seed=0, plies=(0, 12, 24)):
+    """Return count percepts reached by playing random moves."""
+    rng = random.Random(seed)
+    positions = []
+    for k in range(count):
+        board = Board()
+        for _ in range(plies[k % len(plies)]):
+            actions = list(board.get_actions())
+            if not actions:
+                break
+            board.play_action(rng.choice(actions))
+        positions.append(board.get_percepts())
+    return positions
+
+
+def walk(board, depth):
+    """Return the number of nodes of the move tree of board up to depth."""
+    if depth == 0 or board.is_finished():
+        return 1
+    nodes = 1
+    for action in list(board.get_actions()):
+        nodes += walk(board.clone().play_action(action), depth - 1)
+    return nodes
+
+
+def bench(cls, positions, depth):
+    """Return (nodes, seconds) for walking all positions with cls."""
+    nodes = 0
+    start = time.perf_counter()
+    for percepts in positions:
+        nodes += walk(cls(percepts), depth)
+    return nodes, time.perf_counter() - start
+
+
+def bench_actions(cls, positions, repeat=200):
+    """Return the number of get_actions calls per second with cls."""
+    boards = [cls(percepts) for percepts in positions]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board in boards:
+            list(board.get_actions())
+    return repeat * len(boards) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--positions", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, args.seed)
+    results = {}
+    for cls in (Board, FastBoard):
+        nodes, seconds = bench(cls, positions, args.depth)
+        results[cls.__name__] = (nodes, seconds)
+        print("%-10s %9d nodes %8.3fs %10.0f nodes/s" %
+              (cls.__name__, nodes, seconds, nodes / seconds))
+    assert results["Board"][0] == results["FastBoard"][0], "node counts differ"
+    print("speedup: %.1fx" % (results["Board"][1] / results["FastBoard"][1]))
+    for cls in (Board, FastBoard):
+        print("%-10s %10.0f get_actions/s" %
+              (cls.__name__, bench_actions(cls, positions)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Lazy SMP against the single-process search of the TT negamax agent.
+
+Run from the avalam directory:
+    python -m scripts.bench_lazy_smp [--depth 4] [--workers 1 2 4]
+
+Every fixed position is searched with iterative deepening up to the given
+depth, with a fresh table, by the main process alone (1 worker) or with
+helpers sharing the table. Reported: time to depth, nodes of the main
+process and of each helper, the transposition table hit rates and the
+effective speedup (time to depth of 1 worker / time to depth).
+"""
+import argparse
+import math
+import os
+import time
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, iterative_deepening
+from lazy_smp import LazySMPSearch
+from negamax_ab_tt_player import NegaMaxAgent
+from scripts.bench_board import sample_positions
+
+
+def run(workers, positions, depth, tt_bytes):
+    """Return (values, seconds, main stats, helper stats) for all positions."""
+    agent = NegaMaxAgent(tt_bytes)
+    lazy = None
+    if workers > 1:
+        lazy = LazySMPSearch(NegaMaxAgent, workers - 1, tt_bytes)
+        agent.tt = agent.wrap_table(lazy.tt)
+    values = []
+    main = {"nodes": 0, "hits": 0, "probes": 0}
+    helpers = {}
+    seconds = 0.0
+    for percepts in positions:
+        agent.tt.clear()
+        agent.tt.reset_counters()
+        board = FastBoard(percepts)
+        agent.deadline = Deadline()
+        search = lambda d: agent.negamax(board, None, 1, d, d, -math.inf,
+                                         math.inf, 1, agent.tt)
+        start = time.perf_counter()
+        if lazy is None:
+            value, _, _ = iterative_deepening(search, depth, agent.deadline)
+        else:
+            with lazy.helping(board, 1, depth, agent.deadline):
+                value, _, _ = iterative_deepening(search, depth,
+                                                  agent.deadline)
+            for stats in lazy.last_stats:
+                total = helpers.setdefault(stats["worker"],
+                                           {"nodes": 0, "hits": 0,
+                                            "probes": 0})
+                total["nodes"] += stats["nodes"]
+                total["hits"] += stats["hits"]
+                total["probes"] += stats["hits"] + stats["misses"]
+        seconds += time.perf_counter() - start
+        values.append(value)
+        main["nodes"] += agent.deadline.nodes
+        main["hits"] += agent.tt.hits
+        main["probes"] += agent.tt.hits + agent.tt.misses
+    if lazy is not None:
+        lazy.close()
+    return values, seconds, main, helpers
+
+
+def hit_rate(stats):
+    return stats["hits"] / stats["probes"] if stats["probes"] else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--positions", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--tt-bytes", type=int, default=16 << 20)
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, plies=(6, 12, 18))
+    print("%d CPUs, depth %d" % (os.cpu_count(), args.depth))
+    reference = None
+    for workers in args.workers:
+        values, seconds, main_stats, helpers = run(
+            workers, positions, args.depth, args.tt_bytes)
+        if reference is None:
+            reference = seconds
+        print("workers %d: %.2fs, speedup %.2f, values %s" %
+              (workers, seconds, reference / seconds, values))
+        print("  main      nodes %9d  tt hit rate %.3f" %
+              (main_stats["nodes"], hit_rate(main_stats)))
+        for worker, stats in sorted(helpers.items()):
+            print("  helper %d  nodes %9d  tt hit rate %.3f" %
+                  (worker, stats["nodes"], hit_rate(stats)))
+
+
+if __name__ == "__main__":
+    main()
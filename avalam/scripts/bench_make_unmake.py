@@ -0,0 +1,83 @@
+"""
+Measure the cost of clone().play_action() against push()/pop().
+
+Run from the avalam directory:
+    python -m scripts.bench_make_unmake [--depth 3] [--positions 3]
+
+Reports the bytes allocated per search node by each way of generating a
+child, and the throughput of a plain alpha-beta search using them, for both
+avalam.Board and fast_board.FastBoard.
+"""
+import argparse
+import math
+import time
+import tracemalloc
+
+from avalam import Board
+from fast_board import FastBoard
+from scripts.bench_board import sample_positions
+
+
+def child_bytes(cls, percepts, use_push):
+    """Return the number of bytes kept alive by generating one child."""
+    board = cls(percepts)
+    action = next(board.get_actions())
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if use_push:
+        child = board.push(action)
+    else:
+        child = board.clone().play_action(action)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del child
+    return allocated
+
+
+def alpha_beta(board, depth, alpha, beta, color, use_push, counter):
+    """Plain negamax alpha-beta on the score, counting nodes."""
+    counter[0] += 1
+    if depth == 0 or board.is_finished():
+        return board.get_score() * color
+    best = -math.inf
+    for action in list(board.get_actions()):
+        if use_push:
+            value = -alpha_beta(board.push(action), depth - 1, -beta, -alpha,
+                                -color, use_push, counter)
+            board.pop()
+        else:
+            value = -alpha_beta(board.clone().play_action(action), depth - 1,
+                                -beta, -alpha, -color, use_push, counter)
+        best = max(best, value)
+        alpha = max(alpha, value)
+        if alpha >= beta:
+            break
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, args.seed)
+    print("%-10s %-6s %12s %10s %12s" %
+          ("board", "child", "bytes/node", "nodes", "nodes/s"))
+    for cls in (Board, FastBoard):
+        for use_push in (False, True):
+            allocated = child_bytes(cls, positions[0], use_push)
+            counter = [0]
+            start = time.perf_counter()
+            for percepts in positions:
+                alpha_beta(cls(percepts), args.depth, -math.inf, math.inf,
+                           1, use_push, counter)
+            seconds = time.perf_counter() - start
+            print("%-10s %-6s %12d %10d %12.0f" %
+                  (cls.__name__, "push" if use_push else "clone", allocated,
+                   counter[0], counter[0] / seconds))
+
+
+if __name__ == "__main__":
+    main()
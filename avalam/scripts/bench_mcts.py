@@ -0,0 +1,65 @@
+"""
+Playout throughput of the MCTS agent.
+
+Run from the avalam directory:
+    python -m scripts.bench_mcts [--seconds 2] [--positions 3] [--playouts 4]
+        [--batch]
+
+Every sampled position is searched by a fresh MCTSAgent for the given time,
+running --playouts playouts per leaf (all at once on numpy arrays with
+--batch); the iterations, playouts, playouts per second and tree size are
+reported.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, SearchTimeout
+from mcts_player import MCTSAgent
+from scripts.bench_board import sample_positions
+
+
+def run(percepts, seconds, playouts_per_leaf, batch, player=1):
+    """Return (iterations, playouts, seconds, nodes) for one position."""
+    agent = MCTSAgent(seed=0)
+    agent.playouts_per_leaf = playouts_per_leaf
+    agent.batch_playouts = batch
+    board = FastBoard(percepts)
+    agent.reuse_tree(board)
+    agent.np_rng = np.random.default_rng(0)
+    deadline = Deadline(seconds, period=8)
+    iterations = playouts = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            deadline.check()
+            playouts += agent.iterate(board, player)
+            iterations += 1
+    except SearchTimeout:
+        pass
+    return iterations, playouts, time.perf_counter() - start, agent.tree.size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--positions", type=int, default=3)
+    parser.add_argument("--playouts", type=int,
+                        default=MCTSAgent.playouts_per_leaf)
+    parser.add_argument("--batch", action="store_true")
+    args = parser.parse_args()
+
+    print("%6s %10s %10s %12s %10s" %
+          ("ply", "iterations", "playouts", "playouts/s", "nodes"))
+    positions = sample_positions(args.positions, plies=(0, 12, 24))
+    for ply, percepts in zip((0, 12, 24) * args.positions, positions):
+        iterations, playouts, seconds, nodes = run(percepts, args.seconds,
+                                                   args.playouts, args.batch)
+        print("%6d %10d %10d %12.0f %10d" %
+              (ply, iterations, playouts, playouts / seconds, nodes))
+
+
+if __name__ == "__main__":
+    main()
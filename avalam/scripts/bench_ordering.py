@@ -0,0 +1,75 @@
+"""
+Nodes searched by the alpha-beta agents with and without move ordering.
+
+Run from the avalam directory:
+    python -m scripts.bench_ordering [--depth 3] [--positions 6]
+
+Every agent plays each sampled position untimed, i.e. runs iterative
+deepening up to the given depth, once with the MoveOrderer enabled (TT or PV
+move, static order, killers and history) and once with only the TT or PV
+move first. The nodes and seconds of the whole iterative deepening are
+summed over the positions, and the moves chosen are compared.
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import my_player
+import negamax_ab_player
+import negamax_ab_tt_player
+from avalam import Board
+from move_ordering import MoveOrderer
+from scripts.bench_board import sample_positions
+
+AGENTS = {
+    "minmax": my_player.MinMaxAgent,
+    "negamax": negamax_ab_player.NegaMaxAgent,
+    "negamax_tt": negamax_ab_tt_player.NegaMaxAgent,
+}
+
+
+def run(agent_class, enabled, positions, depth):
+    """Return (actions, nodes, seconds) for playing all the positions."""
+    actions = []
+    nodes = 0
+    seconds = 0.0
+    for percepts in positions:
+        agent = agent_class(orderer=MoveOrderer(enabled=enabled))
+        agent.depth = depth
+        board = Board(percepts)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            actions.append(agent.play(dict(vars(board)), 1, 1, None))
+        seconds += time.perf_counter() - start
+        nodes += agent.deadline.nodes
+    return actions, nodes, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", type=int, default=6)
+    parser.add_argument("--agents", nargs="+", choices=sorted(AGENTS),
+                        default=sorted(AGENTS))
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, plies=(0, 8, 16))
+    print("depth %d, %d positions" % (args.depth, len(positions)))
+    print("%-12s %-9s %10s %10s %12s %10s" %
+          ("agent", "ordering", "nodes", "seconds", "nodes/s", "same move"))
+    for name in args.agents:
+        reference = None
+        for enabled in (False, True):
+            actions, nodes, seconds = run(AGENTS[name], enabled, positions,
+                                          args.depth)
+            if reference is None:
+                reference = actions
+            same = sum(a == b for a, b in zip(actions, reference))
+            print("%-12s %-9s %10d %10.2f %12.0f %6d/%d" %
+                  (name, "on" if enabled else "off", nodes, seconds,
+                   nodes / seconds, same, len(actions)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Scaling of the parallel root split of the negamax agents.
+
+Run from the avalam directory:
+    python -m scripts.bench_parallel [--depth 3] [--workers 1 2 4 8]
+
+Every fixed position is searched to the given depth with each number of
+workers (1 is the plain sequential search). The root values must agree; the
+wall time, the nodes per second and the speedup over one worker are
+reported.
+"""
+import argparse
+import os
+import time
+
+import negamax_ab_player
+import negamax_ab_tt_player
+from fast_board import FastBoard
+from iterative_deepening import Deadline
+from scripts.bench_board import sample_positions
+
+AGENTS = {
+    "negamax": negamax_ab_player.NegaMaxAgent,
+    "negamax_tt": negamax_ab_tt_player.NegaMaxAgent,
+}
+
+
+def run(agent_class, workers, positions, depth):
+    """Return (values, nodes, seconds) for searching all the positions."""
+    agent = agent_class()
+    agent.workers = workers
+    values = []
+    nodes = 0
+    start = time.perf_counter()
+    for percepts in positions:
+        agent.deadline = Deadline()
+        if hasattr(agent, "tt"):
+            agent.tt.clear()
+        value, _ = agent.search(FastBoard(percepts), 1, depth)
+        values.append(value)
+        nodes += agent.deadline.nodes
+    seconds = time.perf_counter() - start
+    if agent.splitter is not None:
+        agent.splitter.close()
+    return values, nodes, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--agent", choices=sorted(AGENTS),
+                        default="negamax")
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, plies=(6, 12, 18))
+    print("%d CPUs, agent %s, depth %d" %
+          (os.cpu_count(), args.agent, args.depth))
+    print("%8s %10s %10s %12s %8s" %
+          ("workers", "nodes", "seconds", "nodes/s", "speedup"))
+    reference = None
+    for workers in args.workers:
+        values, nodes, seconds = run(AGENTS[args.agent], workers, positions,
+                                     args.depth)
+        if reference is None:
+            reference = (values, seconds)
+        assert values == reference[0], "root values differ"
+        print("%8d %10d %10.2f %12.0f %8.2f" %
+              (workers, nodes, seconds, nodes / seconds,
+               reference[1] / seconds))
+
+
+if __name__ == "__main__":
+    main()
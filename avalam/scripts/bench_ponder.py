@@ -0,0 +1,92 @@
+"""
+Time saved by pondering during the opponent's turn.
+
+Run from the avalam directory:
+    python -m scripts.bench_ponder [--games 2] [--depth 4] [--sleep 1.0]
+
+The TT agent is served over XML-RPC in this process, as by agent_main, and
+plays fixed-depth games against a greedy agent taking --sleep seconds per
+move, once without pondering and once with --ponder set to that time (one
+helper process). The time the agent took per game, the time saved by
+pondering, and the ponder hit rate (the opponent played the predicted
+reply) are reported.
+"""
+import argparse
+import contextlib
+import os
+import threading
+import time
+
+from avalam import Board, SimpleThreadedXMLRPCServer
+from game import Game, connect_agent
+from greedy_player import GreedyAgent
+from negamax_ab_tt_player import NegaMaxAgent
+from scripts.tournament import LocalAgent
+
+
+class SlowAgent(LocalAgent):
+
+    """Agent called in-process, sleeping before each move."""
+
+    def __init__(self, agent, sleep):
+        LocalAgent.__init__(self, agent)
+        self.sleep = sleep
+
+    def play(self, board, player, step, time_left):
+        time.sleep(self.sleep)
+        return LocalAgent.play(self, board, player, step, time_left)
+
+
+def play_games(agent, games, sleep):
+    """Play games as PLAYER1 against the slow greedy agent. Return the
+    seconds taken by agent per game, and the ponder hits and predictions."""
+    server = SimpleThreadedXMLRPCServer(("localhost", 0), allow_none=True,
+                                        logRequests=False)
+    server.register_instance(agent)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proxy = connect_agent("http://localhost:%d" % server.server_address[1])
+    seconds, hits, predictions = [], 0, 0
+    for _ in range(games):
+        game = Game([proxy, SlowAgent(GreedyAgent(), sleep)], Board(), None,
+                    [None, None])
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            game.play()
+            agent.stop_pondering()
+            hits += agent.cache.hits
+            predictions += agent.cache.hits + agent.cache.misses
+            agent.report_pondering()
+        seconds.append(sum(t for player, _, t in game.trace.actions
+                           if player == 1))
+    server.shutdown()
+    if agent.lazy is not None:
+        agent.lazy.close()
+    return seconds, hits, predictions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--sleep", type=float, default=1.0,
+                        help="seconds taken by the opponent per move")
+    args = parser.parse_args()
+
+    results = {}
+    for ponder in (False, True):
+        agent = NegaMaxAgent()
+        agent.depth = args.depth
+        agent.ponder = ponder
+        agent.ponder_time = args.sleep
+        seconds, hits, predictions = play_games(agent, args.games, args.sleep)
+        results[ponder] = sum(seconds) / len(seconds)
+        print("ponder %-5s %8.2fs per game %s" %
+              (ponder, results[ponder],
+               "hit rate %d / %d" % (hits, predictions) if ponder else ""))
+    print("time saved %8.2fs per game (%.0f%%)" %
+          (results[False] - results[True],
+           100 * (1 - results[True] / results[False])))
+
+
+if __name__ == "__main__":
+    main()
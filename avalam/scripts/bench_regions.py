@@ -0,0 +1,103 @@
+"""
+Endgame solving with region decomposition against the alpha-beta search.
+
+Run from the avalam directory:
+    python -m scripts.bench_regions [--towers 12] [--positions 10]
+
+Random games are played until at most --towers towers can be moved, keeping
+positions with at least two regions. Each one is solved to the end of the
+game by plain alpha-beta (no table nor move ordering: every interleaving of
+the regions is searched), by the TT negamax agent (nodes counted by their
+deadline) and by regions.RegionSolver (states counted); the winners must
+agree. The final counts of RegionSolver must also be exactly those of the
+exhaustive tablebase.Solver (memoized states counted).
+"""
+import argparse
+import math
+import random
+import time
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline
+from move_ordering import MoveOrderer
+from negamax_ab_tt_player import NegaMaxAgent
+from regions import RegionSolver
+from tablebase import Solver, active_part, decode_value
+
+
+def endgame_positions(count, towers, seed=0):
+    """Return count (percepts, player) pairs with at most towers movable
+    towers split in at least two regions."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = FastBoard()
+        player = 1
+        while board.count_movable_towers() > towers:
+            board.push(board.random_action(rng))
+            player = -player
+        if len(board.get_regions()) >= 2:
+            positions.append((board.get_percepts(), player))
+    return positions
+
+
+def sign(x):
+    return (x > 0) - (x < 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--towers", type=int, default=12)
+    parser.add_argument("--positions", type=int, default=10)
+    args = parser.parse_args()
+
+    print("%8s %8s %12s %12s %10s %10s %10s %10s" %
+          ("regions", "movable", "plain nodes", "tt nodes", "tt s",
+           "states", "regions s", "solver"))
+    totals = [0, 0, 0.0, 0, 0.0, 0]
+    for percepts, player in endgame_positions(args.positions, args.towers):
+        board = FastBoard(percepts)
+        depth = board.count_movable_towers()
+        plain = NegaMaxAgent(tt_bytes=1 << 16,
+                             orderer=MoveOrderer(enabled=False))
+        plain.pvs = False
+        plain.deadline = Deadline()
+        plain_value, _ = plain.negamax(board, None, player, depth, depth,
+                                       -math.inf, math.inf, 1, None)
+
+        agent = NegaMaxAgent(tt_bytes=16 << 20)
+        agent.deadline = Deadline()
+        start = time.perf_counter()
+        value, _ = agent.search(board, player, depth)
+        ab_seconds = time.perf_counter() - start
+
+        solver = RegionSolver()
+        start = time.perf_counter()
+        (tower_diff, full_diff), _ = solver.solve_board(board, player)
+        solver_seconds = time.perf_counter() - start
+        assert sign(value) == sign(plain_value) == \
+            sign((tower_diff or full_diff) * player), "winners differ"
+
+        exhaustive = Solver()
+        part_tower_diff, part_full_diff = decode_value(
+            exhaustive.solve(active_part(board, player)))
+        assert (tower_diff, full_diff) == \
+            (board.secured_diff() + part_tower_diff * player,
+             board.full_diff + part_full_diff * player), "final counts differ"
+
+        print("%8d %8d %12d %12d %10.3f %10d %10.3f %10d" %
+              (len(board.get_regions()), depth, plain.deadline.nodes,
+               agent.deadline.nodes, ab_seconds, len(solver.states),
+               solver_seconds, len(exhaustive.values)))
+        totals[0] += plain.deadline.nodes
+        totals[1] += agent.deadline.nodes
+        totals[2] += ab_seconds
+        totals[3] += len(solver.states)
+        totals[4] += solver_seconds
+        totals[5] += len(exhaustive.values)
+    print("%8s %8s %12d %12d %10.3f %10d %10.3f %10d" %
+          (("total", "") + tuple(totals)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Per-move overhead of the agent transports.
+
+Run from the avalam directory:
+    python -m scripts.bench_rpc [--moves 500]
+
+An agent answering immediately is served in this process over XML-RPC and
+over the binary transport of binary_rpc.py, and called --moves times through
+game.connect_agent and Game.timed_exec, as a game does (time credits
+included). The time per call is reported, along with the time of a direct
+call of the agent (tournament.LocalAgent).
+"""
+import argparse
+import threading
+import time
+
+from avalam import Agent, Board, SimpleThreadedXMLRPCServer
+from binary_rpc import SCHEME, BinaryAgentServer
+from game import Game, connect_agent
+from scripts.tournament import LocalAgent
+
+
+class ImmediateAgent(Agent):
+
+    """Agent playing the first move of the board without searching."""
+
+    def play(self, percepts, player, step, time_left):
+        return Board(percepts["m"], percepts["max_height"]) \
+            .get_actions().__next__()
+
+
+def serve(server):
+    """Run server in a background thread and return its port."""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server.server_address[1]
+
+
+def per_move(agent, moves):
+    """Return the mean time of agent.play called by Game.timed_exec."""
+    board = Board()
+    game = Game([agent, agent], board, None, [1000.0, 1000.0])
+    start = time.perf_counter()
+    for step in range(1, moves + 1):
+        game.step = step
+        game.timed_exec("play", board, 1, step)
+    return (time.perf_counter() - start) / moves
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--moves", type=int, default=500)
+    args = parser.parse_args()
+
+    agent = ImmediateAgent()
+    xmlrpc_server = SimpleThreadedXMLRPCServer(("localhost", 0),
+                                               allow_none=True,
+                                               logRequests=False)
+    xmlrpc_server.register_instance(agent)
+    xmlrpc_port = serve(xmlrpc_server)
+    binary_port = serve(BinaryAgentServer(("localhost", 0), agent))
+
+    direct = per_move(LocalAgent(agent), args.moves)
+    for name, uri in (("direct", None),
+                      ("xmlrpc", "http://localhost:%d" % xmlrpc_port),
+                      ("binary", "%slocalhost:%d" % (SCHEME, binary_port))):
+        seconds = direct if uri is None else \
+            per_move(connect_agent(uri), args.moves)
+        print("%-8s %8.1f us per move, overhead %8.1f us" %
+              (name, 1e6 * seconds, 1e6 * (seconds - direct)))
+
+
+if __name__ == "__main__":
+    main()
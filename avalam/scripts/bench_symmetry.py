@@ -0,0 +1,104 @@
+"""
+Effect of the symmetry canonicalization (see symmetry.py).
+
+Run from the avalam directory:
+    python -m scripts.bench_symmetry [--depth 3] [--positions 12]
+        [--towers 8] [--games 300]
+
+Transposition table: positions sampled at various plies are searched to a
+fixed depth by the TT negamax agent with a fresh table, keyed by the plain
+Zobrist key or by the canonical key; the values must agree. Table hit rate,
+entries stored and nodes are reported.
+
+Tablebase: the active parts with at most --towers movable towers of random
+games are solved, then counted as stored in a file (up to symmetry or
+translations only), and the active parts of other random games are probed
+against both sets to compare their coverage.
+"""
+import argparse
+import random
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, iterative_deepening
+from negamax_ab_tt_player import NegaMaxAgent
+from scripts.bench_board import sample_positions
+from tablebase import Solver, active_part, part_key
+from transposition_table import BucketTranspositionTable
+
+
+def search(symmetry, board, player, depth):
+    """Return (value, hit rate, entries, nodes) of a fixed depth search."""
+    agent = NegaMaxAgent(tt_bytes=4 << 20)
+    agent.symmetry = symmetry
+    agent.tt = agent.wrap_table(BucketTranspositionTable(4 << 20))
+    agent.deadline = Deadline()
+    value, _, _ = iterative_deepening(
+        lambda d: agent.search(board, player, d), depth, agent.deadline,
+        board)
+    return (value, agent.tt.stats()["hit_rate"], len(agent.tt),
+            agent.deadline.nodes)
+
+
+def game_parts(games, towers, seed):
+    """Yield the active parts with at most towers movable towers of random
+    games."""
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = FastBoard()
+        player = 1
+        while not board.is_finished():
+            if board.count_movable_towers() <= towers:
+                yield active_part(board, player)
+            board.push(board.random_action(rng))
+            player = -player
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", type=int, default=12)
+    parser.add_argument("--towers", type=int, default=8)
+    parser.add_argument("--games", type=int, default=300)
+    args = parser.parse_args()
+
+    print("%6s %10s %10s %10s %10s %10s %10s" %
+          ("ply", "hits", "entries", "nodes", "sym hits", "sym entries",
+           "sym nodes"))
+    plies = (0, 1, 2, 4, 8, 16)
+    totals = [0, 0, 0, 0]
+    positions = sample_positions(args.positions, seed=2, plies=plies)
+    for k, percepts in enumerate(positions):
+        board = FastBoard(percepts)
+        player = 1 if plies[k % len(plies)] % 2 == 0 else -1
+        value, hits, entries, nodes = search(False, board, player,
+                                             args.depth)
+        sym_value, sym_hits, sym_entries, sym_nodes = search(
+            True, board, player, args.depth)
+        assert value == sym_value, "values differ"
+        print("%6d %10.3f %10d %10d %10.3f %10d %10d" %
+              (plies[k % len(plies)], hits, entries, nodes, sym_hits,
+               sym_entries, sym_nodes))
+        totals[0] += entries
+        totals[1] += nodes
+        totals[2] += sym_entries
+        totals[3] += sym_nodes
+    print("%6s %10s %10d %10d %10s %10d %10d" %
+          ("total", "", totals[0], totals[1], "", totals[2], totals[3]))
+
+    solver = Solver()
+    for part in game_parts(args.games, args.towers, seed=0):
+        solver.solve(part)
+    keys = {part_key(part) for part in solver.values}
+    probes = covered = sym_covered = 0
+    for part in game_parts(args.games, args.towers, seed=1):
+        probes += 1
+        covered += part in solver.values
+        sym_covered += part_key(part) in keys
+    print("tablebase: %d parts, %d up to symmetry; coverage of %d probes "
+          "%.3f, %.3f up to symmetry" % (len(solver.values), len(keys),
+                                         probes, covered / probes,
+                                         sym_covered / probes))
+
+
+if __name__ == "__main__":
+    main()
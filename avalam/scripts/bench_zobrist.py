@@ -0,0 +1,105 @@
+"""
+Compare Zobrist keys with the string/tuple keys of BoardWithTransposition.
+
+Run from the avalam directory:
+    python -m scripts.bench_zobrist [--games 200] [--buckets 4096]
+
+Positions are collected from random games. For every hash of
+transposition_table (fed with the (player,) + flatten() tuple, the content of
+ttentry()), the positions are inserted in a DictTranspositionTable and the
+bucket collisions and insertions per second are reported. The Zobrist key of
+FastBoard is inserted as a native integer key. Key collisions (different
+positions with the same key) are counted separately: flatten() drops the
+empty cells, so the old keys are not injective.
+"""
+import argparse
+import random
+import time
+
+import transposition_table as tt
+from fast_board import FastBoard
+
+HASHES = (
+    tt.SimpleHashTranspositionTable,
+    tt.XorHashTranspositionTable,
+    tt.AddHashTranspositionTable,
+    tt.RotateHashTranspositionTable,
+    tt.BernsteinHashTranspositionTable,
+    tt.ShiftAndAddHashTranspositionTable,
+    tt.FNVHashTranspositionTable,
+    tt.OneAtATimeTranspositionTable,
+    tt.JSWHashTranspositionTable,
+    tt.JenkinsHashTranspositionTable,
+)
+
+
+def collect_positions(games, seed=0):
+    """Return a list of distinct FastBoard positions from random games."""
+    rng = random.Random(seed)
+    seen = set()
+    positions = []
+    for _ in range(games):
+        board = FastBoard()
+        while not board.is_finished():
+            board.push(rng.choice(list(board.get_actions())))
+            if board.key not in seen:
+                seen.add(board.key)
+                positions.append(board.clone())
+    return positions
+
+
+def key_collisions(keys, positions):
+    """Return the number of positions sharing their key with another one."""
+    owners = {}
+    for key, board in zip(keys, positions):
+        owners.setdefault(key, set()).add(tuple(board.cells))
+    return sum(len(cells) - 1 for cells in owners.values())
+
+
+def expected_collisions(n, m):
+    """Return the expected bucket collisions of n random keys in m buckets."""
+    return n - m * (1 - (1 - 1 / m) ** n)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--buckets", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    positions = collect_positions(args.games, args.seed)
+    n = len(positions)
+    print("%d distinct positions, %d buckets, %.0f collisions expected" %
+          (n, args.buckets, expected_collisions(n, args.buckets)))
+
+    flat = [tt.BoardWithTransposition.flatten(board) for board in positions]
+    tuples = [(1, ) + tuple(x) for x in flat]
+    clashes = key_collisions(tuples, positions)
+    strings = ["".join(map(str, key)) for key in tuples]
+    print("ttentry() strings: %d key clashes" %
+          key_collisions(strings, positions))
+    print("%-32s %12s %12s %12s" %
+          ("key", "collisions", "key clashes", "inserts/s"))
+    for cls in HASHES:
+        table = tt.DictTranspositionTable(args.buckets, cls())
+        start = time.perf_counter()
+        for board in positions:
+            table[(1, ) + tuple(tt.BoardWithTransposition.flatten(board))] = 0
+        seconds = time.perf_counter() - start
+        print("%-32s %12d %12d %12.0f" %
+              (cls.__name__, table.collisions(), clashes, n / seconds))
+
+    keys = [board.key for board in positions]
+    table = tt.DictTranspositionTable(args.buckets)
+    start = time.perf_counter()
+    for board in positions:
+        table[board.key] = 0
+    seconds = time.perf_counter() - start
+    print("%-32s %12d %12d %12.0f" %
+          ("Zobrist (FastBoard.key)", table.collisions(),
+           key_collisions(keys, positions), n / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Build an opening book file (see book.py) from trace files.
+
+Run from the avalam directory:
+    python -m scripts.build_book greedy.trace ... [--plies 12] [--min-games 2]
+        [-o book.bin]
+
+The traces are streamed from the trace files written by
+scripts/generate_games.py or scripts/tournament.py (compact or pickled, see
+game.load_trace). Once the book is written, the positions of the
+first games are probed to time the lookups.
+"""
+import argparse
+import time
+
+from book import BookBuilder, OpeningBook, write_book
+from fast_board import FastBoard
+from game import load_trace
+
+
+def traces(paths):
+    """Yield the traces of the given files."""
+    for path in paths:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield load_trace(f)
+                except EOFError:
+                    break
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("traces", nargs="+", help="trace files")
+    parser.add_argument("--plies", type=int, default=12,
+                        help="number of plies of each game counted")
+    parser.add_argument("--min-games", type=int, default=2,
+                        help="minimal number of games of a stored move")
+    parser.add_argument("-o", "--output", default="book.bin")
+    args = parser.parse_args()
+
+    builder = BookBuilder(args.plies)
+    start = time.perf_counter()
+    for trace in traces(args.traces):
+        builder.add_trace(trace)
+    seconds = time.perf_counter() - start
+    count = write_book(args.output, builder, args.min_games)
+    print("%d games, %d moves counted in %.1fs, %d written to %s" %
+          (builder.games, len(builder.stats), seconds, count, args.output))
+
+    book = OpeningBook(args.output)
+    probes = 0
+    seconds = 0.0
+    for trace in traces(args.traces[:1]):
+        board = FastBoard(trace.initial_board.m)
+        for player, action, _ in trace.actions[:args.plies]:
+            start = time.perf_counter()
+            book.probe(board, player)
+            seconds += time.perf_counter() - start
+            board.push(action)
+            probes += 1
+        if probes >= 1000:
+            break
+    if probes:
+        print("%d probes, %.1f us per probe, %d found" %
+              (probes, 1e6 * seconds / probes, book.hits))
+    book.close()
+
+
+if __name__ == "__main__":
+    main()
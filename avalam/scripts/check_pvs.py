@@ -0,0 +1,103 @@
+"""
+Regression check of the PVS and aspiration searches of the TT agent.
+
+Run from the avalam directory:
+    python -m scripts.check_pvs [--depth 3] [--positions 12]
+
+Every sampled position is searched to a fixed depth by plain fail-soft
+alpha-beta (no table, no move ordering, full windows) and by
+negamax_ab_tt_player.NegaMaxAgent with a fresh table and iterative
+deepening, with PVS and aspiration windows enabled or not. The root values
+must be equal, and the move chosen must reach the root value according to
+plain alpha-beta (ties may be broken differently). The exit status is 1 if
+any position disagrees.
+"""
+import argparse
+import math
+import sys
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, iterative_deepening
+from move_ordering import MoveOrderer
+from negamax_ab_tt_player import NegaMaxAgent
+from scripts.bench_board import sample_positions
+
+VARIANTS = {
+    "pvs+aspiration": dict(pvs=True, aspiration=NegaMaxAgent.aspiration),
+    "pvs": dict(pvs=True, aspiration=0),
+    "aspiration": dict(pvs=False, aspiration=NegaMaxAgent.aspiration),
+    "full window": dict(pvs=False, aspiration=0),
+}
+
+
+def plain_agent():
+    agent = NegaMaxAgent(tt_bytes=1 << 16, orderer=MoveOrderer(enabled=False))
+    agent.pvs = False
+    agent.aspiration = 0
+    return agent
+
+
+def plain_value(agent, board, player, depth, action=None):
+    """Return the plain alpha-beta value of board (or of action played
+    from board) for player."""
+    agent.deadline = Deadline()
+    if action is None:
+        return agent.negamax(board, None, player, depth, depth,
+                             -math.inf, math.inf, 1, None)[0]
+    board.push(action)
+    value = -agent.negamax(board, action, player, depth - 1, depth,
+                           -math.inf, math.inf, -1, None)[0]
+    board.pop()
+    return value
+
+
+def variant_search(options, board, player, depth):
+    """Return (value, action, nodes) of the TT agent with options."""
+    agent = NegaMaxAgent(tt_bytes=4 << 20)
+    agent.pvs = options["pvs"]
+    agent.aspiration = options["aspiration"]
+    agent.deadline = Deadline()
+    value, action, _ = iterative_deepening(
+        lambda d: agent.search(board, player, d), depth, agent.deadline,
+        board)
+    return value, action, agent.deadline.nodes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", type=int, default=12)
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, seed=1,
+                                 plies=(0, 6, 12, 18, 24, 30))
+    reference = plain_agent()
+    nodes = {name: 0 for name in VARIANTS}
+    failures = 0
+    for k, percepts in enumerate(positions):
+        board = FastBoard(percepts)
+        if board.is_finished():
+            continue
+        player = 1 if k % 2 == 0 else -1
+        expected = plain_value(reference, board, player, args.depth)
+        for name, options in VARIANTS.items():
+            value, action, n = variant_search(options, board, player,
+                                              args.depth)
+            nodes[name] += n
+            reached = plain_value(reference, board, player, args.depth,
+                                  action)
+            if value != expected or reached != expected:
+                failures += 1
+                print("position %d, %s: value %s move %s (worth %s), "
+                      "expected %s" % (k, name, value, action, reached,
+                                       expected))
+
+    print("depth %d, %d positions" % (args.depth, len(positions)))
+    for name in VARIANTS:
+        print("%-16s %10d nodes" % (name, nodes[name]))
+    print("OK" if not failures else "%d FAILURES" % failures)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
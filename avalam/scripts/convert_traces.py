@@ -0,0 +1,66 @@
+"""
+Convert trace files to the compact format of trace_file.py.
+
+Run from the avalam directory:
+    python -m scripts.convert_traces greedy.pkl ... -o greedy.trace
+
+The traces of the input files (pickled or compact) are appended to the
+output file, then both are read back: all the traces by game.load_trace,
+and the output file by TraceReader (games and numpy move arrays). The
+sizes and read times are reported.
+"""
+import argparse
+import os
+import time
+
+from game import load_trace
+from trace_file import TraceReader, TraceWriter
+
+
+def load_all(path):
+    """Return the list of the traces of a file, read by load_trace."""
+    traces = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                traces.append(load_trace(f))
+            except EOFError:
+                return traces
+
+
+def timed(name, size, function):
+    start = time.perf_counter()
+    count = function()
+    seconds = time.perf_counter() - start
+    print("%-32s %8d games %10d bytes %8.3fs" % (name, count, size, seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("traces", nargs="+", help="trace files")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    traces = []
+    for path in args.traces:
+        traces += load_all(path)
+    with TraceWriter(args.output) as writer:
+        for trace in traces:
+            writer.write(trace)
+
+    for path in args.traces:
+        timed("load_trace %s" % path, os.path.getsize(path),
+              lambda: len(load_all(path)))
+    size = os.path.getsize(args.output)
+    timed("load_trace %s" % args.output, size,
+          lambda: len(load_all(args.output)))
+    reader = TraceReader(args.output)
+    # Not timing the import of numpy
+    next(reader.move_arrays(), None)
+    timed("TraceReader.games", size, lambda: sum(1 for _ in reader.games()))
+    timed("TraceReader.move_arrays", size,
+          lambda: sum(1 for _ in reader.move_arrays()))
+
+
+if __name__ == "__main__":
+    main()
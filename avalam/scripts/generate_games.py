@@ -1,21 +1,18 @@
-from ..game import Trace, connect_agent, Game, Board
-import pickle
+from game import Trace, connect_agent, Game, Board
+from trace_file import TraceWriter
 from queue import Queue
 from threading import Thread
-import threading
 import concurrent.futures
 
 enclosure_queue = Queue()
-lock = threading.Lock()
 
 def save_trace():
-    while True:
-        trace: Trace = enclosure_queue.get()
-        lock.acquire()
-        with open('assets/greedy.pkl', 'ab') as f:
-            pickle.dump(trace, f)
-        lock.release()
-        enclosure_queue.task_done()
+    # Appends are atomic: other processes may write to the same file
+    with TraceWriter('assets/greedy.trace') as writer:
+        while True:
+            trace: Trace = enclosure_queue.get()
+            writer.write(trace)
+            enclosure_queue.task_done()
 
 def play():
     agents = ['http://localhost:8000', 'http://localhost:8000']
@@ -0,0 +1,82 @@
+"""
+Generate an endgame tablebase file (see tablebase.py).
+
+Run from the avalam directory:
+    python -m scripts.generate_tablebase [--towers 10] [--games 2000]
+        [--traces greedy.trace ...] [-o tablebase.bin]
+
+Random games (and the games of the given trace files, as written by
+scripts/generate_games.py) are played until at most --towers towers can
+still be moved; the active part of that position is solved exhaustively,
+which solves every active part reachable from it as well. All the values
+are then written to the output file.
+"""
+import argparse
+import random
+import time
+
+from fast_board import FastBoard
+from game import load_trace
+from tablebase import Solver, active_part, write_tablebase
+
+
+def random_games(count, seed):
+    """Yield the (board, player) positions of count random games."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        board = FastBoard()
+        player = 1
+        while not board.is_finished():
+            yield board, player
+            board.push(board.random_action(rng))
+            player = -player
+
+
+def trace_games(paths):
+    """Yield the (board, player) positions of the games of trace files."""
+    for path in paths:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    trace = load_trace(f)
+                except EOFError:
+                    break
+                board = FastBoard(trace.initial_board.m)
+                for player, action, _ in trace.actions:
+                    yield board, player
+                    board.push(action)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--towers", type=int, default=10,
+                        help="maximal number of movable towers")
+    parser.add_argument("--games", type=int, default=2000,
+                        help="number of random games")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--traces", nargs="*", default=[],
+                        help="trace files")
+    parser.add_argument("-o", "--output", default="tablebase.bin")
+    args = parser.parse_args()
+
+    solver = Solver()
+    start = time.perf_counter()
+    for positions in (random_games(args.games, args.seed),
+                      trace_games(args.traces)):
+        last = None
+        for board, player in positions:
+            # Only the first position of each game under the limit is
+            # needed: the following ones are reachable from it
+            if board is last:
+                continue
+            if board.count_movable_towers() <= args.towers:
+                solver.solve(active_part(board, player))
+                last = board
+    seconds = time.perf_counter() - start
+    count = write_tablebase(args.output, solver, args.towers)
+    print("%d active parts solved in %.1fs, %d entries up to symmetry "
+          "written to %s" % (len(solver.values), seconds, count, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Headless self-play tournament between agent classes.
+
+Run from the avalam directory:
+    python -m scripts.tournament negamax_tt greedy "mcts,iterations=200"
+        [--gauntlet] [--games 10] [--time 60] [--processes 4] [--seed 0]
+        [--traces games.trace]
+
+Agents are given by a name of AGENTS or as module:Class, followed by
+comma-separated attribute settings (e.g. negamax_tt,depth=3). Every pair of
+agents plays --games games (the first agent against each of the others with
+--gauntlet), alternating colours, in a pool of processes. The agents are
+imported and called directly, without XML-RPC servers, by game.Game; each
+game gets fresh agents and its own seed for the random generators. The
+traces are appended to --traces as they arrive, in the compact format of
+trace_file.py.
+
+Reported: the results of each pair with the Elo difference and its 95%
+confidence interval, the score of each agent and the games per second.
+"""
+import argparse
+import ast
+import concurrent.futures
+import contextlib
+import importlib
+import itertools
+import math
+import os
+import random
+import time
+
+from avalam import Board
+from game import Game
+from trace_file import TraceWriter
+
+AGENTS = {
+    "random": "random_player:RandomAgent",
+    "greedy": "greedy_player:GreedyAgent",
+    "minmax": "my_player:MinMaxAgent",
+    "negamax": "negamax_ab_player:NegaMaxAgent",
+    "negamax_tt": "negamax_ab_tt_player:NegaMaxAgent",
+    "mcts": "mcts_player:MCTSAgent",
+}
+
+
+def make_agent(spec, seed):
+    """Return a new agent from its specification, its random generators
+    seeded with seed."""
+    name, *settings = spec.split(",")
+    module, cls = AGENTS.get(name, name).split(":")
+    agent = getattr(importlib.import_module(module), cls)()
+    for setting in settings:
+        attribute, value = setting.split("=", 1)
+        setattr(agent, attribute, ast.literal_eval(value))
+    if isinstance(getattr(agent, "rng", None), random.Random):
+        agent.rng.seed(seed)
+    return agent
+
+
+class LocalAgent:
+
+    """Agent called in-process with the percepts it would get over
+    XML-RPC."""
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def play(self, board, player, step, time_left):
+        percepts = {"m": board.get_percepts(), "rows": board.rows,
+                    "columns": board.columns, "max_height": board.max_height}
+        return self.agent.play(percepts, player, step, time_left)
+
+
+def play_game(specs, credit, seed):
+    """Play a game between two agent specifications (PLAYER1 first).
+    Return its Trace and its duration."""
+    random.seed(seed)
+    agents = [LocalAgent(make_agent(spec, seed + k))
+              for k, spec in enumerate(specs)]
+    game = Game(agents, Board(), None, [credit, credit])
+    start = time.perf_counter()
+    # The agents report their searches on stdout
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        game.play()
+    return game.trace, time.perf_counter() - start
+
+
+def elo(score, games):
+    """Return the Elo difference of a score out of games and its 95%
+    confidence interval: the Wilson score interval of the score, assuming
+    independent games and counting a draw as half a win. Unlike the normal
+    interval, it keeps a width at a score of 0% or 100%."""
+    def difference(p):
+        p = min(max(p, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / p - 1)
+    z = 1.96
+    p = score / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    error = z / (1 + z * z / games) * math.sqrt(
+        p * (1 - p) / games + z * z / (4 * games * games))
+    return difference(p), difference(center - error), \
+        difference(center + error)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("agents", nargs="+",
+                        help="agent names or module:Class, with settings")
+    parser.add_argument("--gauntlet", action="store_true",
+                        help="play the first agent against the others only")
+    parser.add_argument("--games", type=int, default=10,
+                        help="games per pair of agents")
+    parser.add_argument("--time", type=float, default=None,
+                        help="time credit of each agent per game")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--traces", help="file the traces are appended to")
+    args = parser.parse_args()
+
+    if args.gauntlet:
+        pairs = [(0, k) for k in range(1, len(args.agents))]
+    else:
+        pairs = list(itertools.combinations(range(len(args.agents)), 2))
+    # results[a, b] = [wins, draws, losses] of a against b
+    results = {pair: [0, 0, 0] for pair in pairs}
+    traces = TraceWriter(args.traces) if args.traces else None
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(args.processes) as pool:
+        futures = {}
+        for (a, b), g in itertools.product(pairs, range(args.games)):
+            first, second = (a, b) if g % 2 == 0 else (b, a)
+            seed = args.seed + len(futures)
+            future = pool.submit(play_game, (args.agents[first],
+                                             args.agents[second]),
+                                 args.time, seed)
+            futures[future] = (a, b, first, second)
+        for n, future in enumerate(
+                concurrent.futures.as_completed(futures)):
+            a, b, first, second = futures[future]
+            trace, seconds = future.result()
+            if traces is not None:
+                traces.write(trace)
+            winner = trace.winner if first == a else -trace.winner
+            results[a, b][0 if winner > 0 else 1 if winner == 0 else 2] += 1
+            print("game %d/%d: %s vs %s, %s (%s), %.1fs" %
+                  (n + 1, len(futures), args.agents[first],
+                   args.agents[second],
+                   "draw" if trace.winner == 0 else "%s won" %
+                   args.agents[first if trace.winner > 0 else second],
+                   trace.reason or "score %d" % trace.winner, seconds))
+    seconds = time.perf_counter() - start
+    if traces is not None:
+        traces.close()
+
+    print()
+    print("%-30s %-30s %5s %5s %5s %20s" %
+          ("agent", "opponent", "wins", "draws", "losses", "elo (95% ci)"))
+    scores = [[0.0, 0] for _ in args.agents]
+    for (a, b), (wins, draws, losses) in results.items():
+        games = wins + draws + losses
+        difference, low, high = elo(wins + draws / 2, games)
+        print("%-30s %-30s %5d %5d %5d %6.0f [%5.0f, %5.0f]" %
+              (args.agents[a], args.agents[b], wins, draws, losses,
+               difference, low, high))
+        scores[a][0] += wins + draws / 2
+        scores[a][1] += games
+        scores[b][0] += losses + draws / 2
+        scores[b][1] += games
+    print()
+    for spec, (score, games) in zip(args.agents, scores):
+        print("%-30s %6.1f / %d" % (spec, score, games))
+    games = len(pairs) * args.games
+    print("%d games in %.1fs, %.2f games/s" % (games, seconds,
+                                               games / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Warm a transposition table file and measure the warm start it gives.
+
+Run from the avalam directory:
+    python -m scripts.warm_table [-o warm.tt] [--size 16] [--games 6]
+        [--plies 6] [--depth 3]
+
+The TT negamax agent plays --games openings of random moves with a table
+file (see transposition_table.PersistentTable): the first --plies positions
+of each are searched to --depth with a fresh in-memory table, and the deep
+results are merged into the file at the start of the next game, as
+agent_main does. The same openings are then searched again with and without
+the file, and fresh openings as well, reporting the nodes searched, the
+hits in the file and the time to map it.
+"""
+import argparse
+import os
+import random
+import time
+
+from fast_board import FastBoard
+from iterative_deepening import Deadline, iterative_deepening
+from negamax_ab_tt_player import NegaMaxAgent
+from transposition_table import FileTranspositionTable
+
+
+def openings(games, plies, seed):
+    """Return games lists of the (percepts, player) positions of random
+    openings of plies moves."""
+    rng = random.Random(seed)
+    games_positions = []
+    for _ in range(games):
+        board = FastBoard()
+        player = 1
+        positions = []
+        for _ in range(plies):
+            positions.append((board.get_percepts(), player))
+            board.push(board.random_action(rng))
+            player = -player
+        games_positions.append(positions)
+    return games_positions
+
+
+def play(agent, positions, depth):
+    """Search positions as one game, return the nodes searched."""
+    agent.initialize(None, None)
+    nodes = 0
+    for percepts, player in positions:
+        board = FastBoard(percepts, player=player)
+        agent.tt.new_search()
+        agent.deadline = Deadline()
+        iterative_deepening(lambda d: agent.search(board, player, d), depth,
+                            agent.deadline, board)
+        nodes += agent.deadline.nodes
+    return nodes
+
+
+def search_all(path, games, depth):
+    """Return (nodes, file hits) of the games searched with a fresh agent
+    reading the table file path (if not None), without merging into it."""
+    agent = NegaMaxAgent(tt_bytes=4 << 20)
+    agent.tt_file = path
+    agent.merge_depth = 1 << 8
+    nodes = sum(play(agent, positions, depth) for positions in games)
+    hits = 0 if agent.persistent is None else agent.persistent.file_hits
+    return nodes, hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", default="warm.tt")
+    parser.add_argument("--size", type=int, default=16,
+                        help="size of the table file in MB")
+    parser.add_argument("--games", type=int, default=6)
+    parser.add_argument("--plies", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=3)
+    args = parser.parse_args()
+
+    games = openings(args.games, args.plies, seed=0)
+    agent = NegaMaxAgent(tt_bytes=args.size << 20)
+    agent.tt_file = args.output
+    agent.merge_depth = 2
+    for k, positions in enumerate(games):
+        nodes = play(agent, positions, args.depth)
+        print("warming game %d: %d nodes" % (k + 1, nodes))
+    agent.persistent.merge(wait=True)
+
+    start = time.perf_counter()
+    table = FileTranspositionTable(args.output)
+    seconds = time.perf_counter() - start
+    entries = sum(1 for data in table.words[3::2] if data)
+    table.close()
+    print("%s: %d bytes, %d entries, mapped in %.1f us" %
+          (args.output, os.path.getsize(args.output), entries, 1e6 * seconds))
+
+    fresh = openings(args.games, args.plies, seed=1)
+    for name, positions in (("same openings", games),
+                            ("fresh openings", fresh)):
+        cold, _ = search_all(None, positions, args.depth)
+        warm, hits = search_all(args.output, positions, args.depth)
+        print("%-15s cold %9d nodes, warm %9d nodes (%d file hits)" %
+              (name, cold, warm, hits))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Search statistics of the agents, written as JSON lines.
+
+The agents only report their moves on stdout. When given a SearchStats (the
+stats attribute of MinMaxAgent and of both NegaMaxAgent classes, set by the
+--stats option of agent_main), they count what their search does during
+each move and write one JSON object per searched move:
+
+    agent, step, player, action, depth -- the move played
+    seconds, nodes, qnodes, nps -- totals of the move (qnodes are the nodes
+        of the quiescence search, included in nodes)
+    nodes_per_ply, qnodes_per_ply -- the same, by distance to the root
+    cutoffs, first_cutoff_rate -- beta cutoffs, and the fraction of them
+        caused by the first move searched (a measure of move ordering)
+    tt_probes, tt_hits -- transposition table lookups
+    ebf -- effective branching factor, the ratio between the nodes of the
+        last two iterations (None with a single iteration)
+    iterations -- depth, nodes and seconds of each completed iteration
+
+The stats attribute is None by default, which costs one test per node.
+Only the process playing is counted: the helpers of parallel searches are
+not. Book moves and solved endgames are not reported.
+
+"""
+import json
+import sys
+import time
+
+# Maximal number of plies counted
+MAX_PLY = 64
+
+
+class SearchStats:
+
+    """Counters of the search of the current move, and the file to which
+    they are written."""
+
+    def __init__(self, path="-", agent=None):
+        """Write to the file path (appended to, "-" for stderr, stdout
+        being mixed with the other output of the agents), the records tagged
+        with agent."""
+        self.file = sys.stderr if path == "-" else \
+            open(path, "a", buffering=1)
+        self.agent = agent
+        self.start_move(0, 0)
+
+    def start_move(self, step, player):
+        """Reset the counters for the search of a new move."""
+        self.step = step
+        self.player = player
+        self.nodes = [0] * (MAX_PLY + 1)
+        self.qnodes = [0] * (MAX_PLY + 1)
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.iterations = []
+        self.start = time.perf_counter()
+
+    def node(self, ply):
+        """Count a node at ply (the plies beyond MAX_PLY counted as
+        MAX_PLY)."""
+        self.nodes[min(ply, MAX_PLY)] += 1
+
+    def qnode(self, ply):
+        """Count a node of the quiescence search (also counted by node)."""
+        self.qnodes[min(ply, MAX_PLY)] += 1
+
+    def cutoff(self, first):
+        """Count a beta cutoff, caused by the first move searched if first."""
+        self.cutoffs += 1
+        if first:
+            self.first_cutoffs += 1
+
+    def probe(self, hit):
+        """Count a lookup of the transposition table."""
+        self.tt_probes += 1
+        if hit:
+            self.tt_hits += 1
+
+    def iteration(self, depth):
+        """Record the end of the iteration searching to depth."""
+        self.iterations.append({
+            "depth": depth,
+            "nodes": sum(self.nodes) - sum(i["nodes"] for i in self.iterations),
+            "seconds": round(time.perf_counter() - self.start
+                             - sum(i["seconds"] for i in self.iterations), 6),
+        })
+
+    def record(self, action, depth):
+        """Return the record of the move."""
+        seconds = time.perf_counter() - self.start
+        nodes = sum(self.nodes)
+        ebf = None
+        if len(self.iterations) > 1 and self.iterations[-2]["nodes"]:
+            ebf = self.iterations[-1]["nodes"] / self.iterations[-2]["nodes"]
+        return {
+            "agent": self.agent,
+            "step": self.step,
+            "player": self.player,
+            "action": None if action is None else list(action),
+            "depth": depth,
+            "seconds": round(seconds, 6),
+            "nodes": nodes,
+            "qnodes": sum(self.qnodes),
+            "nps": round(nodes / seconds) if seconds else None,
+            "nodes_per_ply": _trim(self.nodes),
+            "qnodes_per_ply": _trim(self.qnodes),
+            "cutoffs": self.cutoffs,
+            "first_cutoff_rate": self.first_cutoffs / self.cutoffs
+            if self.cutoffs else None,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "ebf": ebf,
+            "iterations": self.iterations,
+        }
+
+    def emit(self, action, depth):
+        """Write the record of the move searched to depth, action played."""
+        self.file.write(json.dumps(self.record(action, depth)) + "\n")
+        self.file.flush()
+
+
+def _trim(counts):
+    """Return counts without its trailing zeros."""
+    end = len(counts)
+    while end and not counts[end - 1]:
+        end -= 1
+    return counts[:end]
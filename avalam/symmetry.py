@@ -0,0 +1,102 @@
+"""
+Symmetries of Avalam positions.
+
+The value of a position for the side to move does not change when the
+colours are swapped together with the side to move, nor when the board is
+mapped onto itself by a symmetry of its shape. The standard board is only
+invariant under the rotation by 180 degrees (its mirror images are not
+playable boards), whereas the active parts of the tablebase (see
+tablebase.py) are free of the board shape and have the 8 symmetries of the
+square.
+
+CanonicalTable keys a transposition table by FastBoard.canonical_key(), so
+that a position and its symmetric ones share their entry, and canonical_part
+gives the form of the active parts from which the tablebase keys are
+computed.
+
+"""
+
+
+class CanonicalTable:
+
+    """Transposition table wrapper keying positions by their canonical key.
+
+    The entries are stored for the canonical position: the move of an entry
+    stored from the rotated position is rotated when stored and rotated back
+    when looked up. The positions must be given as FastBoard whose player
+    attribute is the side to move; anything else (statistics, generations,
+    new_search...) is forwarded to the wrapped table.
+
+    """
+
+    def __init__(self, table):
+        self.__dict__["table"] = table
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.table, name, value)
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, board):
+        """
+        Request the entry in the table, return None if not found.
+        """
+        key, rotated = board.canonical_key()
+        entry = self.table.lookup(key)
+        if entry is not None and rotated and entry["move"] is not None:
+            entry = dict(entry, move=board.rotate_action(entry["move"]))
+        return entry
+
+    def __call__(self, board):
+        """
+        Request the move of the entry in the table.
+        """
+        entry = self.lookup(board)
+        if entry is None:
+            raise KeyError(board)
+        return entry["move"]
+
+    def store(self, **data):
+        """
+        Store the data of the position data["game"] in the table.
+        """
+        board = data.pop("game")
+        key, rotated = board.canonical_key()
+        if rotated and data.get("move") is not None:
+            data["move"] = board.rotate_action(data["move"])
+        self.table.store(key=key, **data)
+
+
+def canonical_part(towers):
+    """Return the canonical form of a set of towers up to translations and
+    symmetries of the square: the smallest of its sorted images translated
+    to the origin.
+
+    Arguments:
+    towers -- iterable of (i, j, h) triplets
+
+    """
+    towers = list(towers)
+    if not towers:
+        return ()
+    best = None
+    for transposed in (False, True):
+        if transposed:
+            towers = [(j, i, h) for i, j, h in towers]
+        rows = [t[0] for t in towers]
+        columns = [t[1] for t in towers]
+        i0, i1 = min(rows), max(rows)
+        j0, j1 = min(columns), max(columns)
+        for image in (
+                [(i - i0, j - j0, h) for i, j, h in towers],
+                [(i - i0, j1 - j, h) for i, j, h in towers],
+                [(i1 - i, j - j0, h) for i, j, h in towers],
+                [(i1 - i, j1 - j, h) for i, j, h in towers]):
+            image.sort()
+            if best is None or image < best:
+                best = image
+    return tuple(best)
@@ -0,0 +1,226 @@
+"""
+Endgame tablebase of the movable towers of Avalam.
+
+A frozen tower (see FastBoard.secured) never moves nor gets covered again,
+and a tower that has become frozen never thaws: late in the game the result
+only depends on the few towers that can still be moved, and on the frozen
+ones through the score they already secure. The active part of a position
+is the set of its movable towers, described by their coordinates translated
+to the origin and their heights signed from the point of view of the side to
+move. The value of an active part is the best final (tower_diff, full_diff)
+pair the side to move can get from it, compared lexicographically as the
+score of Board.get_score() does, encoded as tower_diff * 32 + full_diff.
+
+solve() computes the values by exhaustive negamax over the active parts;
+write_tablebase() saves them in a file of sorted 64-bit keys (a hash of the
+active part, up to the symmetries of the square: see symmetry.py, they are
+only used for the file, as they make solving much slower for few shared
+parts) and 16-bit values, and Tablebase memory-maps such a file for
+the agents to probe.
+
+File layout: header (magic, version, max_height, max_towers, count), count
+keys ("Q", sorted), count values ("h").
+
+"""
+import bisect
+import hashlib
+import mmap
+import struct
+
+from symmetry import canonical_part
+
+MAGIC = b"AVTB"
+VERSION = 2
+HEADER = struct.Struct("<4sHHHxxQ")
+
+# Neighbour offsets of a tower
+_AROUND = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def encode_value(tower_diff, full_diff):
+    """Return the integer ordered as the (tower_diff, full_diff) pairs."""
+    return tower_diff * 32 + full_diff
+
+
+def decode_value(value):
+    """Return the (tower_diff, full_diff) pair of an encoded value."""
+    tower_diff = (value + 16) // 32
+    return tower_diff, value - 32 * tower_diff
+
+
+def canonical(towers):
+    """Return the canonical form of an active part.
+
+    Arguments:
+    towers -- iterable of (i, j, h) triplets, h signed for the side to move
+
+    """
+    towers = list(towers)
+    if not towers:
+        return ()
+    i0 = min(t[0] for t in towers)
+    j0 = min(t[1] for t in towers)
+    return tuple(sorted((i - i0, j - j0, h) for i, j, h in towers))
+
+
+def part_key(part):
+    """Return the 64-bit key of a canonical active part, the same for all
+    its images by the symmetries of the square."""
+    data = bytes(x + 16 for t in canonical_part(part) for x in t)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+                          "little")
+
+
+def active_part(board, player):
+    """Return the canonical active part of board with player to move."""
+    columns = board.columns
+    cells = board.cells
+    masks = board.masks
+    return canonical(divmod(c, columns) + (cells[c] * player, )
+                     for c in board.geometry.cells if masks[c])
+
+
+def tower_moves(towers, max_height):
+    """Yield the (a, b) pairs of coordinates such that a can go on b."""
+    for (i, j), h in towers.items():
+        for di, dj in _AROUND:
+            other = towers.get((i + di, j + dj))
+            if other is not None and abs(h) + abs(other) <= max_height:
+                yield (i, j), (i + di, j + dj)
+
+
+def movable_towers(towers, max_height):
+    """Return the set of the coordinates of the movable towers."""
+    return {a for a, _ in tower_moves(towers, max_height)}
+
+
+class Solver:
+
+    """Exhaustive negamax over the active parts, memoized on their
+    canonical form."""
+
+    def __init__(self, max_height=5):
+        self.max_height = max_height
+        self.values = {}
+
+    def solve(self, part):
+        """Return the encoded value of a canonical active part."""
+        value = self.values.get(part)
+        if value is not None:
+            return value
+        max_height = self.max_height
+        towers = {(i, j): h for i, j, h in part}
+        best = None
+        for a, b in tower_moves(towers, max_height):
+            child = dict(towers)
+            h = child.pop(a)
+            sign = 1 if h > 0 else -1
+            child[b] = sign * (abs(h) + abs(child[b]))
+            movable = movable_towers(child, max_height)
+            # The towers frozen by the move are scored right away
+            gained = 0
+            for c, x in child.items():
+                if c not in movable:
+                    sign = 1 if x > 0 else -1
+                    gained += encode_value(
+                        sign, sign if abs(x) == max_height else 0)
+            rest = canonical((i, j, -x) for (i, j), x in child.items()
+                             if (i, j) in movable)
+            value = gained - self.solve(rest)
+            if best is None or value > best:
+                best = value
+        if best is None:
+            best = 0
+        self.values[part] = best
+        return best
+
+
+def solve_positions(boards, max_towers, solver=None):
+    """Solve the active parts of the given (board, player) pairs having up
+    to max_towers movable towers, and all the parts reachable from them.
+    Return the Solver."""
+    solver = Solver() if solver is None else solver
+    for board, player in boards:
+        if board.count_movable_towers() <= max_towers:
+            solver.solve(active_part(board, player))
+    return solver
+
+
+def write_tablebase(path, solver, max_towers):
+    """Write the values of solver to the file path and return the number
+    of entries written."""
+    values = {}
+    for part, value in solver.values.items():
+        key = part_key(part)
+        # Symmetric parts share their key, different ones would make the
+        # table unsound
+        assert values.setdefault(key, value) == value, "key collision"
+    entries = sorted(values.items())
+    keys = [key for key, _ in entries]
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, solver.max_height, max_towers,
+                            len(entries)))
+        f.write(struct.pack("<%dQ" % len(keys), *keys))
+        f.write(struct.pack("<%dh" % len(entries),
+                            *(value for _, value in entries)))
+    return len(entries)
+
+
+class Tablebase:
+
+    """Read-only, memory-mapped tablebase file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_height, self.max_towers, self.count = \
+            HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a tablebase file" % path)
+        start = HEADER.size
+        self.keys = memoryview(self.mmap)[start:start + 8 * self.count] \
+            .cast("Q")
+        start += 8 * self.count
+        self.values = memoryview(self.mmap)[start:start + 2 * self.count] \
+            .cast("h")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, part):
+        """Return the encoded value of a canonical active part, or None."""
+        key = part_key(part)
+        k = bisect.bisect_left(self.keys, key)
+        if k < self.count and self.keys[k] == key:
+            self.hits += 1
+            return self.values[k]
+        self.misses += 1
+        return None
+
+    def probe(self, board, player):
+        """Return the final (tower_diff, full_diff) of board, from the point
+        of view of PLAYER1, under best play with player to move, or None if
+        the position is not in the table.
+
+        Arguments:
+        board -- a FastBoard
+        player -- the side to move
+
+        """
+        if board.n_movable > self.max_towers or \
+                board.max_height != self.max_height:
+            return None
+        value = self.lookup(active_part(board, player))
+        if value is None:
+            return None
+        tower_diff, full_diff = decode_value(value)
+        # Towers of maximal height are always frozen
+        return (board.secured_diff() + tower_diff * player,
+                board.full_diff + full_diff * player)
+
+    def close(self):
+        self.keys.release()
+        self.values.release()
+        self.mmap.close()
@@ -0,0 +1,216 @@
+"""
+Compact binary format of game traces.
+
+A trace file starts with a header (magic, version) followed by one record
+per game:
+- the record header RECORD: marker, flags, reason, winner, number of moves
+  and the two time limits (NaN for an unlimited agent);
+- if FLAG_BOARD is set (the initial board is not the standard one): rows,
+  columns and max_height ("B" each), then the cells ("b", row by row);
+- if FLAG_REASON is set (a reason other than those of REASONS): its length
+  ("B") and its UTF-8 text;
+- the moves, packed by transposition_table.pack_action ("H" each), then the
+  time taken for each move in seconds ("e" each).
+The players alternate, starting with PLAYER1 unless FLAG_PLAYER2 is set. A
+game of n moves thus takes 16 + 4n bytes.
+
+TraceWriter appends records with a single write on a file opened in append
+mode, so that several processes can append to the same file without
+locking. TraceReader memory-maps a file and iterates over its games without
+copying the moves nor building boards; load_trace (game.py) reads these
+files as well as pickled traces.
+
+"""
+import collections
+import math
+import mmap
+import os
+import struct
+
+from avalam import Board, PLAYER1
+from transposition_table import pack_action, unpack_action
+
+MAGIC = b"AVGT"
+VERSION = 1
+HEADER = struct.Struct("<4sHxx")
+MARKER = b"GT"
+RECORD = struct.Struct("<2sBBhH2f")
+FLAG_PLAYER2 = 1
+FLAG_BOARD = 2
+FLAG_REASON = 4
+# Reasons given by game.Game, stored as their index
+REASONS = ("", "Opponent's time credit has expired.",
+           "Opponent has played an invalid action.")
+
+# A game of a trace file: first_player, winner, reason, time_limits (a pair
+# of seconds or None), board (a list of rows, or None for the standard
+# initial board), max_height, actions (a memoryview of the packed moves in
+# the file) and times (a tuple of seconds)
+GameRecord = collections.namedtuple(
+    "GameRecord", "first_player winner reason time_limits board max_height "
+            "actions times")
+
+
+def encode_trace(trace):
+    """Return the record of a game.Trace."""
+    actions = trace.actions
+    flags = 0
+    if actions and actions[0][0] != PLAYER1:
+        flags |= FLAG_PLAYER2
+    extra = b""
+    board = trace.initial_board
+    if board.m != Board().m or board.max_height != Board().max_height:
+        flags |= FLAG_BOARD
+        extra += struct.pack("<3B", board.rows, board.columns,
+                             board.max_height)
+        extra += struct.pack("<%db" % (board.rows * board.columns),
+                             *(x for row in board.m for x in row))
+    if trace.reason in REASONS:
+        reason = REASONS.index(trace.reason)
+    else:
+        flags |= FLAG_REASON
+        reason = 0
+        text = trace.reason.encode()[:255]
+        extra += struct.pack("<B", len(text)) + text
+    limits = [math.nan if t is None else t for t in trace.time_limits]
+    return b"".join((
+        RECORD.pack(MARKER, flags, reason, trace.winner, len(actions),
+                    *limits),
+        extra,
+        struct.pack("<%dH" % len(actions),
+                    *(pack_action(action) for _, action, _ in actions)),
+        struct.pack("<%de" % len(actions), *(t for _, _, t in actions)),
+    ))
+
+
+def decode_game(buffer, offset):
+    """Return (game, end) for the record starting at offset in buffer, end
+    being the offset of the next record. Raise EOFError if the record is
+    incomplete."""
+    if offset + RECORD.size > len(buffer):
+        raise EOFError
+    marker, flags, reason, winner, n, *limits = \
+        RECORD.unpack_from(buffer, offset)
+    if marker != MARKER:
+        raise ValueError("no trace record at offset %d" % offset)
+    offset += RECORD.size
+    board = None
+    max_height = Board().max_height
+    try:
+        if flags & FLAG_BOARD:
+            rows, columns, max_height = struct.unpack_from("<3B", buffer,
+                                                           offset)
+            offset += 3
+            cells = struct.unpack_from("<%db" % (rows * columns), buffer,
+                                       offset)
+            offset += rows * columns
+            board = [list(cells[i * columns:(i + 1) * columns])
+                     for i in range(rows)]
+        if flags & FLAG_REASON:
+            length = buffer[offset]
+            reason = bytes(buffer[offset + 1:offset + 1 + length]).decode()
+            offset += 1 + length
+        else:
+            reason = REASONS[reason]
+    except (struct.error, IndexError):
+        raise EOFError
+    end = offset + 4 * n
+    if end > len(buffer):
+        raise EOFError
+    view = memoryview(buffer)
+    game = GameRecord(
+        -PLAYER1 if flags & FLAG_PLAYER2 else PLAYER1, winner, reason,
+        tuple(None if math.isnan(t) else t for t in limits), board,
+        max_height, view[offset:offset + 2 * n].cast("H"),
+        struct.unpack_from("<%de" % n, buffer, offset + 2 * n))
+    return game, end
+
+
+def game_to_trace(game):
+    """Return the game.Trace of a game of a trace file."""
+    from game import Trace
+    board = Board() if game.board is None else \
+        Board(game.board, max_height=game.max_height)
+    trace = Trace(board, game.time_limits)
+    player = game.first_player
+    for packed, t in zip(game.actions, game.times):
+        trace.add_action(player, unpack_action(packed), t)
+        player = -player
+    trace.set_winner(game.winner, game.reason)
+    return trace
+
+
+class TraceWriter:
+
+    """Append-only writer of a trace file, safe for concurrent writers."""
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            # Create the file with its header under a temporary name, so
+            # that no writer can append before the header
+            temp = "%s.%d.tmp" % (path, os.getpid())
+            with open(temp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION))
+            try:
+                os.link(temp, path)
+            except FileExistsError:
+                pass
+            os.unlink(temp)
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    def write(self, trace):
+        """Append a game.Trace to the file."""
+        os.write(self.fd, encode_trace(trace))
+
+    def close(self):
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+
+    """Memory-mapped trace file, read without copying the moves."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if size else b""
+        if size:
+            magic, version = HEADER.unpack_from(self.mmap)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("%s is not a trace file" % path)
+
+    def games(self):
+        """Yield the games of the file (see GameRecord). An incomplete last
+        record, being appended, is skipped."""
+        offset = HEADER.size
+        while offset < len(self.mmap):
+            try:
+                game, offset = decode_game(self.mmap, offset)
+            except EOFError:
+                return
+            yield game
+
+    def traces(self):
+        """Yield the games of the file as game.Trace objects."""
+        for game in self.games():
+            yield game_to_trace(game)
+
+    def move_arrays(self):
+        """Yield, for every game, (first_player, winner, moves) where moves
+        is a numpy array of the packed moves sharing the memory of the
+        file."""
+        import numpy as np
+        for game in self.games():
+            yield (game.first_player, game.winner,
+                   np.frombuffer(game.actions, dtype=np.uint16))
+
+    def close(self):
+        if isinstance(self.mmap, mmap.mmap):
+            self.mmap.close()
@@ -1,7 +1,13 @@
 
 
+import mmap
+import os
 import pickle
 import json
+import struct
+import threading
+from array import array
+from multiprocessing import shared_memory
 from typing import Optional
 from avalam import *
 from ast import literal_eval as make_tuple
@@ -14,30 +20,51 @@ class BoardWithTransposition(Board):
     def ttentry(self, player: int):
         return "".join(map(str, (player, ) + tuple(self.flatten())))
 
+def table_key(board):
+    """
+    Returns the key of a position in a transposition table.
+    Integers (Zobrist keys) are used as is and boards keeping an incremental
+    Zobrist key (FastBoard) give their key. Other boards raise TypeError:
+    their ttentry() strings leave out the side to move unless given it.
+    """
+    if type(board) is int:
+        return board
+    key = getattr(board, "key", None)
+    if key is None:
+        raise TypeError("%s has no Zobrist key, use a FastBoard" %
+                        type(board).__name__)
+    return key
+
+
 class TranspositionTable:
     """
     Transposition table from a python dictionary.
+    Positions can be given as boards or directly as Zobrist keys.
     """
     def __init__(self, own_dict=None) -> None:
         self.d = own_dict if own_dict is not None else dict()
 
-    def lookup(self, board: BoardWithTransposition):
+    def lookup(self, board):
         """
         Request the entry in the table, return None if not found.
         """
-        return self.d.get(board.ttentry(), None)
+        return self.d.get(table_key(board), None)
 
-    def __call__(self, board: BoardWithTransposition):
+    def __call__(self, board):
         """
         Request the entry in the table, return None if not found.
         """
-        return self.d[board.ttentry()]["move"]
+        return self.d[table_key(board)]["move"]
 
     def store(self, **data):
         """
         Store the data in the table.
+        The position is given either as game=board or as key=zobrist_key.
         """
-        entry = data.pop("game").ttentry()
+        if "game" in data:
+            entry = table_key(data.pop("game"))
+        else:
+            entry = data.pop("key")
         self.d[entry] = data
 
     def to_file(self, filename) -> None:
@@ -77,6 +104,499 @@ class TranspositionTable:
                 self.d = data
 
 
+NO_MOVE = 0xFFFF
+
+
+def pack_action(action):
+    """
+    Packs an action (i1, j1, i2, j2) in 16 bits, 4 bits per coordinate.
+    """
+    if action is None:
+        return NO_MOVE
+    i1, j1, i2, j2 = action
+    return i1 << 12 | j1 << 8 | i2 << 4 | j2
+
+
+def unpack_action(packed):
+    """
+    Inverse of pack_action.
+    """
+    if packed == NO_MOVE:
+        return None
+    return (packed >> 12, packed >> 8 & 15, packed >> 4 & 15, packed & 15)
+
+
+class BucketTranspositionTable:
+    """
+    Fixed-size transposition table preallocated in flat arrays.
+
+    The table holds as many entries as fit in size_bytes. Entries are grouped
+    in buckets of two slots: the first one keeps the deepest result (an
+    entry is only replaced by a deeper one, or when it is stale), the second
+    one is always replaced. Each entry is tagged with the generation of the
+    search that stored it; new_search() starts a new generation so that the
+    entries of the previous moves are evicted first.
+
+    Lookups and stores use the same interface as TranspositionTable, entries
+    being returned as dictionaries with the keys depth, value, move and flag.
+    Counters: hits, misses, collisions (lookups of a bucket holding other
+    positions only), stores and overwrites (live entries of other positions
+    replaced by a store).
+    """
+
+    # key (Q), value (d), depth (b), flag (b), generation (B), move (H)
+    ENTRY_BYTES = 8 + 8 + 1 + 1 + 1 + 2
+
+    def __init__(self, size_bytes=64 << 20):
+        self.num_buckets = max(1, size_bytes // (2 * self.ENTRY_BYTES))
+        n = 2 * self.num_buckets
+        self.keys = array("Q", bytes(8 * n))
+        self.values = array("d", bytes(8 * n))
+        self.depths = array("b", b"\xff" * n)  # -1 marks an empty slot
+        self.flags = array("b", bytes(n))
+        self.generations = array("B", bytes(n))
+        self.moves = array("H", bytes(2 * n))
+        self.generation = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """
+        Starts a new generation, making the current entries stale.
+        """
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        """
+        Empties the table.
+        """
+        self.depths = array("b", b"\xff" * len(self.depths))
+
+    def _entry(self, slot):
+        return {
+            "depth": self.depths[slot],
+            "value": self.values[slot],
+            "move": unpack_action(self.moves[slot]),
+            "flag": self.flags[slot],
+        }
+
+    def lookup(self, board):
+        """
+        Request the entry in the table, return None if not found.
+        """
+        key = table_key(board)
+        slot = (key % self.num_buckets) << 1
+        depths = self.depths
+        keys = self.keys
+        if depths[slot] >= 0 and keys[slot] == key:
+            self.hits += 1
+            return self._entry(slot)
+        if depths[slot + 1] >= 0 and keys[slot + 1] == key:
+            self.hits += 1
+            return self._entry(slot + 1)
+        if depths[slot] >= 0 or depths[slot + 1] >= 0:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def __call__(self, board):
+        """
+        Request the move stored for board, raise KeyError if not found.
+        """
+        entry = self.lookup(board)
+        if entry is None:
+            raise KeyError(table_key(board))
+        return entry["move"]
+
+    def _write(self, slot, key, depth, value, move, flag):
+        if self.depths[slot] >= 0 and self.keys[slot] != key:
+            self.overwrites += 1
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.values[slot] = value
+        self.moves[slot] = move
+        self.flags[slot] = flag
+        self.generations[slot] = self.generation
+
+    def store(self, **data):
+        """
+        Store the data in the table.
+        The position is given either as game=board or as key=zobrist_key,
+        along with depth, value, move and flag.
+        """
+        if "game" in data:
+            key = table_key(data["game"])
+        else:
+            key = data["key"]
+        depth = data["depth"]
+        entry = (key, depth, data["value"], pack_action(data.get("move")),
+                 data["flag"])
+        self.stores += 1
+        slot = (key % self.num_buckets) << 1
+        depths = self.depths
+        if depths[slot] >= 0 and self.keys[slot] == key:
+            self._write(slot, *entry)
+        elif depths[slot] < 0 or depth >= depths[slot] or \
+                self.generations[slot] != self.generation:
+            if depths[slot] >= 0:
+                # demote the replaced entry to the always-replace slot (this
+                # also drops an older copy of key held there)
+                self._write(slot + 1, self.keys[slot], depths[slot],
+                            self.values[slot], self.moves[slot],
+                            self.flags[slot])
+                self.generations[slot + 1] = self.generations[slot]
+            self._write(slot, *entry)
+        else:
+            self._write(slot + 1, *entry)
+
+    def __len__(self):
+        return sum(1 for depth in self.depths if depth >= 0)
+
+    def stats(self):
+        """
+        Returns the counters as a dictionary.
+        """
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
+
+
+class SharedTranspositionTable:
+    """
+    Lock-free transposition table in shared memory.
+
+    Several processes can use the same table: one creates it, the others
+    attach to it with its name. Each entry is two 64-bit words, the packed
+    data and the key XORed with the data. A reader accepts an entry only if
+    both words agree with its key, so entries torn by concurrent writes are
+    seen as misses instead of corrupting the search. Values are stored as
+    32-bit integers.
+
+    Buckets have a depth-preferred and an always-replace slot, as in
+    BucketTranspositionTable. The counters are local to each process.
+    """
+
+    ENTRY_BYTES = 16
+    # The first two words hold the number of buckets (the shared memory
+    # block may be larger than requested)
+    HEADER_WORDS = 2
+    VALUE_OFFSET = 1 << 31
+
+    def __init__(self, size_bytes=64 << 20, name=None):
+        """
+        Creates a table of size_bytes, or attaches to the table called name.
+        """
+        if name is None:
+            num_buckets = max(1, size_bytes // (2 * self.ENTRY_BYTES))
+            self.shm = shared_memory.SharedMemory(
+                create=True,
+                size=8 * self.HEADER_WORDS + 2 * self.ENTRY_BYTES * num_buckets)
+            self.words = self.shm.buf.cast("Q")
+            self.words[0] = num_buckets
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.words = self.shm.buf.cast("Q")
+            self.owner = False
+        self.name = self.shm.name
+        self.num_buckets = self.words[0]
+        self.generation = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def new_search(self):
+        """
+        Starts a new generation, making the current entries stale.
+        """
+        self.generation = (self.generation + 1) & 0x3F
+
+    def clear(self):
+        """
+        Empties the table.
+        """
+        start = 8 * self.HEADER_WORDS
+        self.shm.buf[start:] = bytes(len(self.shm.buf) - start)
+
+    def _pack(self, depth, value, move, flag):
+        return ((int(value) + self.VALUE_OFFSET) & 0xFFFFFFFF
+                | pack_action(move) << 32
+                | (depth + 1) << 48
+                | (flag + 1) << 56
+                | self.generation << 58)
+
+    def _unpack(self, data):
+        return {
+            "depth": (data >> 48 & 0xFF) - 1,
+            "value": (data & 0xFFFFFFFF) - self.VALUE_OFFSET,
+            "move": unpack_action(data >> 32 & 0xFFFF),
+            "flag": (data >> 56 & 3) - 1,
+        }
+
+    def _index(self, key):
+        return self.HEADER_WORDS + ((key % self.num_buckets) << 2)
+
+    def lookup(self, board):
+        """
+        Request the entry in the table, return None if not found.
+        """
+        key = table_key(board)
+        i = self._index(key)
+        words = self.words
+        for j in (i, i + 2):
+            data = words[j + 1]
+            if data and words[j] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)
+        if words[i + 1] or words[i + 3]:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def __call__(self, board):
+        """
+        Request the move stored for board, raise KeyError if not found.
+        """
+        entry = self.lookup(board)
+        if entry is None:
+            raise KeyError(table_key(board))
+        return entry["move"]
+
+    def store(self, **data):
+        """
+        Store the data in the table.
+        The position is given either as game=board or as key=zobrist_key,
+        along with depth, value, move and flag.
+        """
+        if "game" in data:
+            key = table_key(data["game"])
+        else:
+            key = data["key"]
+        depth = data["depth"]
+        packed = self._pack(depth, data["value"], data.get("move"),
+                            data["flag"])
+        self.stores += 1
+        i = self._index(key)
+        words = self.words
+        old = words[i + 1]
+        if not old or words[i] ^ old == key or \
+                depth >= (old >> 48 & 0xFF) - 1 or \
+                old >> 58 != self.generation:
+            j = i
+        else:
+            j = i + 2
+        words[j + 1] = packed
+        words[j] = key ^ packed
+
+    def stats(self):
+        """
+        Returns the counters as a dictionary.
+        """
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
+
+    def close(self):
+        """
+        Detaches from the table, destroying it if this process created it.
+        """
+        self.words.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class FileTranspositionTable(SharedTranspositionTable):
+    """
+    SharedTranspositionTable kept in a memory-mapped file.
+
+    The file holds the same words as the shared memory block (after a header
+    of the number of buckets and a magic word), so that the table persists
+    from one game to the next and several processes can map it at once:
+    readers map it read-only and never lock, their key check rejecting the
+    entries torn by a concurrent writer, while writers hold an exclusive
+    lock on the file (see merge_entries).
+    """
+
+    MAGIC = int.from_bytes(b"AVTT\x01\x00\x00\x00", "little")
+
+    def __init__(self, path, size_bytes=64 << 20, writable=False):
+        """
+        Maps the table of the file path, created with size_bytes of entries
+        if it does not exist and writable is true.
+        """
+        if writable and not os.path.exists(path):
+            # Other processes only ever see a complete empty table
+            num_buckets = max(1, size_bytes // (2 * self.ENTRY_BYTES))
+            temp = "%s.%d.tmp" % (path, os.getpid())
+            with open(temp, "wb") as f:
+                f.write(struct.pack("<QQ", num_buckets, self.MAGIC))
+                f.truncate(8 * self.HEADER_WORDS
+                           + 2 * self.ENTRY_BYTES * num_buckets)
+            # Never replace a table another process has created meanwhile
+            # (and may be merging into)
+            try:
+                os.link(temp, path)
+            except FileExistsError:
+                pass
+            os.unlink(temp)
+        self.file = open(path, "r+b" if writable else "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE
+                              if writable else mmap.ACCESS_READ)
+        self.words = memoryview(self.mmap).cast("Q")
+        if len(self.words) < self.HEADER_WORDS or \
+                self.words[1] != self.MAGIC:
+            self.close()
+            raise ValueError("%s is not a transposition table file" % path)
+        self.name = path
+        self.owner = False
+        self.num_buckets = self.words[0]
+        self.generation = 0
+        self.reset_counters()
+
+    def clear(self):
+        """
+        Empties the table (writable tables only).
+        """
+        start = 8 * self.HEADER_WORDS
+        self.mmap[start:] = bytes(len(self.mmap) - start)
+
+    def close(self):
+        """
+        Unmaps the table.
+        """
+        self.words.release()
+        self.mmap.close()
+        self.file.close()
+
+
+def merge_entries(path, entries, size_bytes=64 << 20):
+    """
+    Stores entries, a dictionary {key: (depth, value, move, flag)}, in the
+    table file path (created with size_bytes of entries if needed), holding
+    an exclusive lock on the file meanwhile.
+    """
+    import fcntl
+    table = FileTranspositionTable(path, size_bytes, writable=True)
+    try:
+        fcntl.flock(table.file.fileno(), fcntl.LOCK_EX)
+        for key, (depth, value, move, flag) in entries.items():
+            table.store(key=key, depth=depth, value=value, move=move,
+                        flag=flag)
+        table.mmap.flush()
+    finally:
+        table.close()
+
+
+class PersistentTable:
+    """
+    Transposition table warm-started from a table file.
+
+    The positions missing from table are looked up in the file table, mapped
+    read-only. The stores go to table, and those searched at least
+    merge_depth deep are also kept to be merged into the file by merge(), in
+    a background thread (e.g. once a game is over). Anything else is
+    forwarded to table.
+    """
+
+    def __init__(self, table, path, merge_depth=4, size_bytes=64 << 20):
+        self.__dict__.update(table=table, path=path, merge_depth=merge_depth,
+                             size_bytes=size_bytes, file=None, pending={},
+                             merging=None, file_hits=0)
+        if os.path.exists(path):
+            self.__dict__["file"] = FileTranspositionTable(path)
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.table, name, value)
+
+    def __len__(self):
+        return len(self.table)
+
+    def set_table(self, table):
+        """
+        Replaces the table in front of the file.
+        """
+        self.__dict__["table"] = table
+
+    def lookup(self, board):
+        """
+        Request the entry in the table, then in the file, return None if not
+        found.
+        """
+        entry = self.table.lookup(board)
+        if entry is None and self.file is not None:
+            entry = self.file.lookup(board)
+            if entry is not None:
+                self.__dict__["file_hits"] += 1
+        return entry
+
+    def __call__(self, board):
+        """
+        Request the move stored for board, raise KeyError if not found.
+        """
+        entry = self.lookup(board)
+        if entry is None:
+            raise KeyError(table_key(board))
+        return entry["move"]
+
+    def store(self, **data):
+        """
+        Store the data in the table, keeping the deep results for the file.
+        """
+        self.table.store(**data)
+        if data["depth"] >= self.merge_depth:
+            key = table_key(data["game"]) if "game" in data else data["key"]
+            self.pending[key] = (data["depth"], data["value"],
+                                 data.get("move"), data["flag"])
+
+    def merge(self, wait=False):
+        """
+        Merge the pending results into the file in a background thread
+        (waiting for its end if wait is true). The file is mapped once it
+        exists and no merge is running.
+        """
+        if self.merging is not None:
+            self.merging.join()
+            self.__dict__["merging"] = None
+        if self.file is None and os.path.exists(self.path):
+            self.__dict__["file"] = FileTranspositionTable(self.path)
+        entries = self.pending
+        if not entries:
+            return
+        self.__dict__["pending"] = {}
+        merging = threading.Thread(target=merge_entries,
+                                   args=(self.path, entries, self.size_bytes),
+                                   daemon=True)
+        merging.start()
+        self.__dict__["merging"] = merging
+        if wait:
+            self.merge()
+
+
 class HashTranspositionTable:
     """
     Base Class for various types of hashes
@@ -159,8 +679,12 @@ class DictTranspositionTable:
         """
         Given a key this will create a number and then convert it to
         an index for the dict.
+        Integer keys are Zobrist keys, already uniformly distributed, and
+        are used directly.
         """
         self.num_calls += 1
+        if type(key) is int:
+            return key % len(self.dict)
         return self.hash(key) % len(self.dict)
 
     def get_slot(self, key, default=None):